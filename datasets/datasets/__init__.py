@@ -7,10 +7,23 @@ from typing import Optional
 from pydantic import BaseModel
 
 
+class Catalog(BaseModel):
+    # a HDF5 file or a directory with one .npy file per field
+    path: str
+    # the field linking the rows to halos (e.g. "fof_halo_bin_tag" for profiles)
+    tag_field: str = "fof_halo_tag"
+
+
 class Dataset(BaseModel):
     name: str
     system: str
     required_globus_groups: Optional[list[str]] = None
+    # Change the version whenever the data changes, invalidates cached results
+    version: str = "1"
+    # catalogs by type, e.g. "halos", "profiles", "galaxies", "particles"
+    catalogs: dict[str, Catalog] = {}
+    # where the precomputed tag indexes are stored, defaults to next to the catalogs
+    index_directory: Optional[str] = None
 
     # Add other stuff here to work with datasets, such as data paths
 
@@ -25,4 +38,4 @@ for _dataset_file in _dataset_path.glob("*.json"):
         _dataset_dict = json.load(f)
     datasets[_dataset_dict["name"]] = Dataset(**_dataset_dict)
 
-__all__ = ["datasets", "Dataset"]
+__all__ = ["datasets", "Catalog", "Dataset"]
@@ -0,0 +1,46 @@
+# Endpoint configurations and the resource estimates of the compute functions. The
+# entry-point uses the estimates to select the endpoint configuration of a request,
+# before the parameters are validated on the compute endpoint. Part of the datasets
+# package so that the entry-point can import it without the endpoint package, keep
+# it free of heavy dependencies.
+from typing import Callable, Literal
+
+from . import Dataset
+
+# Endpoint configurations per system, see
+# endpoint/config/<system>/compute-portal-<system>-*
+ResourceClass = Literal["1-node", "4-node", "16-node"]
+resource_classes: list[ResourceClass] = ["1-node", "4-node", "16-node"]
+default_resource_class: ResourceClass = "1-node"
+
+# Estimates the resource class from the (unvalidated) request parameters and the
+# dataset. May raise KeyError, TypeError or ValueError for invalid parameters.
+ResourceEstimator = Callable[[dict, Dataset], ResourceClass]
+
+# Rows of the example task that one node writes in reasonable time
+example_rows_per_node = 100_000_000
+
+
+def estimate_example_resources(params: dict, dataset: Dataset) -> ResourceClass:
+    # Tasks that scale with the input estimate the work from the parameters (here
+    # the number of rows) and the dataset, and pick the smallest configuration that
+    # handles it
+    nodes = int(params.get("nrows", 0)) / example_rows_per_node
+    if nodes <= 1:
+        return "1-node"
+    if nodes <= 4:
+        return "4-node"
+    return "16-node"
+
+
+# By compute function slug, functions without an estimate run on the default
+resource_estimators: dict[str, ResourceEstimator] = {
+    "_exampletask": estimate_example_resources,
+}
+
+
+def estimate_resources(slug: str, params: dict, dataset: Dataset) -> ResourceClass:
+    estimator = resource_estimators.get(slug)
+    if estimator is None:
+        return default_resource_class
+    return estimator(params, dataset)
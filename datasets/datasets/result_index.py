@@ -0,0 +1,219 @@
+# Shared index of cached results: the compute endpoints publish the results in their
+# result cache to an SQLite database, which the entry-point queries before
+# dispatching a request. Part of the datasets package so that the entry-point can
+# import it without the endpoint package, keep it free of heavy dependencies.
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+
+from . import Dataset
+
+_schema = [
+    """
+    CREATE TABLE IF NOT EXISTS cached_results (
+        cache_key TEXT PRIMARY KEY,
+        function TEXT NOT NULL,
+        result TEXT NOT NULL,
+        files TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS parameter_schemas (
+        function TEXT PRIMARY KEY,
+        schema TEXT NOT NULL
+    )
+    """,
+]
+
+
+def _hash(data: dict) -> str:
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _get_key(
+    slug: str, parameters: dict, dataset_name: str, dataset_version: str
+) -> str:
+    return _hash(
+        {
+            "function": slug,
+            "parameters": parameters,
+            "dataset": dataset_name,
+            "dataset_version": dataset_version,
+        }
+    )
+
+
+def get_cache_key(slug: str, parameters: BaseModel, dataset: Dataset) -> str:
+    """
+    Content-addressed key of a compute function result: a hash of the compute
+    function slug, the validated parameters (in canonical form) and the dataset
+    version.
+    """
+    return _get_key(
+        slug, parameters.model_dump(mode="json"), dataset.name, dataset.version
+    )
+
+
+def get_parameter_schema(parameters: BaseModel) -> dict[str, Any]:
+    """
+    The field names and defaults of a parameter model, published to the index so
+    that the entry-point, which cannot import the parameter models, can normalize
+    requests the same way (see `normalize_params`).
+    """
+    fields = type(parameters).model_fields
+    return {
+        "fields": list(fields),
+        "defaults": {
+            name: to_jsonable_python(field.get_default(call_default_factory=True))
+            for name, field in fields.items()
+            if not field.is_required()
+        },
+    }
+
+
+def get_index_request(
+    slug: str, parameters: BaseModel, dataset: Dataset
+) -> dict[str, Any]:
+    """
+    What the compute endpoints publish to the index along with a result (JSON
+    compatible, see `publish_result`): the slug of the compute function (as called by
+    the entry-point), the parameter schema, the validated parameters and the dataset
+    version.
+    """
+    return {
+        "function": slug,
+        "parameter_schema": get_parameter_schema(parameters),
+        "parameters": parameters.model_dump(mode="json"),
+        "dataset": dataset.name,
+        "dataset_version": dataset.version,
+    }
+
+
+def normalize_params(params: dict, schema: dict[str, Any]) -> dict:
+    """
+    The request parameters as the parameter model would dump them: unknown keys
+    are dropped and missing fields take their default. Values are not coerced, a
+    request with e.g. "1" instead of 1 does not match the cached result.
+    """
+    return schema["defaults"] | {
+        name: params[name] for name in schema["fields"] if name in params
+    }
+
+
+def publish_result(
+    index_path: Path,
+    cache_key: str,
+    request: dict[str, Any],
+    result: dict,
+    files: list[Path],
+) -> None:
+    """
+    Publish the `result` of a cached run for the `request` (see `get_index_request`),
+    `files` are the published result files that need to exist for the result to be
+    valid. Raises a ValueError if the entry-point would not find the result again.
+    """
+    slug = request["function"]
+    with sqlite3.connect(index_path, timeout=30) as connection:
+        for statement in _schema:
+            connection.execute(statement)
+        connection.execute(
+            "INSERT OR REPLACE INTO parameter_schemas VALUES (?, ?)",
+            (slug, json.dumps(request["parameter_schema"])),
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO cached_results VALUES (?, ?, ?, ?, ?)",
+            (
+                cache_key,
+                slug,
+                json.dumps(result),
+                json.dumps([str(f) for f in files]),
+                datetime.now().isoformat(),
+            ),
+        )
+    connection.close()
+    # the lookup of the entry-point, with the parameters as validated
+    lookup_key, lookup = _lookup(
+        index_path,
+        slug,
+        request["parameters"],
+        request["dataset"],
+        request["dataset_version"],
+    )
+    if lookup_key != cache_key or lookup is None:
+        unpublish_results(index_path, [cache_key])
+        raise ValueError(
+            f"The entry-point can't look up the result {cache_key} of {slug} (looked "
+            f"up as {lookup_key})"
+        )
+
+
+def unpublish_results(index_path: Path, cache_keys: list[str]) -> None:
+    if not cache_keys or not index_path.is_file():
+        return
+    with sqlite3.connect(index_path, timeout=30) as connection:
+        connection.executemany(
+            "DELETE FROM cached_results WHERE cache_key = ?",
+            [(k,) for k in cache_keys],
+        )
+    connection.close()
+
+
+def lookup_result(
+    index_path: Path, slug: str, params: dict, dataset: Dataset
+) -> Optional[dict]:
+    """
+    Returns the published result of an equivalent request, or None. Results whose
+    files are gone (e.g. the run was cleaned up) are removed from the index.
+    """
+    return _lookup(index_path, slug, params, dataset.name, dataset.version)[1]
+
+
+def _lookup(
+    index_path: Path,
+    slug: str,
+    params: dict,
+    dataset_name: str,
+    dataset_version: str,
+) -> tuple[Optional[str], Optional[dict]]:
+    # the key of the request (None without a parameter schema) and the result
+    if not index_path.is_file():
+        return None, None
+    try:
+        connection = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+        try:
+            schema_row = connection.execute(
+                "SELECT schema FROM parameter_schemas WHERE function = ?", (slug,)
+            ).fetchone()
+            if schema_row is None:
+                return None, None
+            cache_key = _get_key(
+                slug,
+                normalize_params(params, json.loads(schema_row[0])),
+                dataset_name,
+                dataset_version,
+            )
+            row = connection.execute(
+                "SELECT result, files FROM cached_results WHERE cache_key = ?",
+                (cache_key,),
+            ).fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return None, None
+    if row is None:
+        return cache_key, None
+    if not all(Path(f).is_file() for f in json.loads(row[1])):
+        try:
+            unpublish_results(index_path, [cache_key])
+        except sqlite3.Error:
+            pass
+        return cache_key, None
+    return cache_key, json.loads(row[0])
@@ -1,3 +1,5 @@
+from datasets.resources import default_resource_class, resource_classes
+
 from .functions import compute_functions
 
-__all__ = ["compute_functions"]
+__all__ = ["compute_functions", "default_resource_class", "resource_classes"]
@@ -4,11 +4,11 @@ from ._compute_function import ComputeFunctionDefinition
 def _exampletask(params: dict, run_id: str):
     import os
     import string
-    import subprocess
 
     from pydantic import ValidationError
 
     from endpoint import output
+    from endpoint.datasets import datasets
     from endpoint.scripts.example_task.parameter_model import ExampleParameters
 
     # sanitize run_id
@@ -26,6 +26,22 @@ def _exampletask(params: dict, run_id: str):
             "message": f"Error during parameter validation:\n{e}",
         }
 
+    files_to_link = {
+        "preview": "preview.json",
+        "results": "example-task.hdf5",
+    }
+
+    # return the result of a previous run with the same parameters
+    dataset = datasets[parameters.dataset]
+    # keyed by the slug, which the entry-point looks the result up with
+    cache_key = output.get_cache_key("_exampletask", parameters, dataset)
+    index_request = output.get_index_request("_exampletask", parameters, dataset)
+    cached_result = output.lookup_cached_result(
+        "example", run_id, cache_key, files_to_link, index_request
+    )
+    if cached_result is not None:
+        return cached_result
+
     working_directory = output.get_working_directory("example", run_id)
     os.chdir(working_directory)
 
@@ -41,21 +57,25 @@ def _exampletask(params: dict, run_id: str):
         mpi_cmd = ["mpiexec", "-n", str(nranks), "--hostfile", nodefile]
     elif os.environ["HCP_SYSTEM"] == "PERLMUTTER":
         mpi_cmd = ["srun", "--cpu-bind=cores"]
-    process = subprocess.run(
+    # stdout / stderr are streamed to the log files of this run
+    process = output.run_streaming(
+        "example",
+        run_id,
         mpi_cmd
         + [
             cmd,
             *args,
         ],
-        capture_output=True,
-        text=True,
     )
 
-    files_to_link = {
-        "preview": "preview.json",
-        "results": "example-task.hdf5",
-    }
-    return output.handle_output("example", run_id, process, files_to_link)
+    return output.handle_output(
+        "example",
+        run_id,
+        process,
+        files_to_link,
+        cache_key=cache_key,
+        index_request=index_request,
+    )
 
 
 exampletask = ComputeFunctionDefinition(
@@ -1,7 +1,10 @@
+import json
+from datetime import datetime, timezone
 from pathlib import Path
 
 import click
 import globus_compute_sdk
+import yaml
 from dotenv import load_dotenv
 from globus_compute_sdk.serialize import DillCodeSource
 
@@ -27,6 +30,52 @@ load_dotenv()
 # Path to root of this repository
 endpoint_template_root = Path(__file__).parent.parent / "config"
 default_globus_group = "OpenCosmo"
+# Version of the function registry format (see `write_function_registry`)
+function_registry_version = 1
+# Outside of the repository, so that deployments don't leave system specific UUIDs
+# in the tree. Must match the default search path in entrypoint/entrypoint/registry.py
+function_registry_root = Path.home() / ".globus_compute" / "function_registries"
+
+
+def write_function_registry(
+    registry_path: Path, system: str, config_paths: list[Path]
+) -> None:
+    """
+    Write the slug -> UUID mapping of all registered compute functions to a json
+    file. The entry-point uses this registry to resolve function UUIDs without
+    querying Globus, and the provider limits of the endpoints to balance the load.
+    """
+    registered_at = datetime.now(timezone.utc).isoformat()
+    endpoints = []
+    for config_path in config_paths:
+        with open(config_path, "r") as f:
+            provider = yaml.safe_load(f)["engine"]["provider"]
+        endpoints.append(
+            {
+                "name": config_path.stem,
+                "max_blocks": provider.get("max_blocks"),
+                "nodes_per_block": provider.get("nodes_per_block"),
+            }
+        )
+    registry = {
+        "version": function_registry_version,
+        "system": system,
+        "created_at": registered_at,
+        "functions": [
+            {
+                "slug": compute_function.slug,
+                "uuid": compute_function.globus_uuid,
+                "systems": compute_function.systems,
+                "endpoint_name": endpoint["name"],
+                "registered_at": registered_at,
+            }
+            for compute_function in compute_functions
+            for endpoint in endpoints
+        ],
+        "endpoints": endpoints,
+    }
+    with open(registry_path, "w") as f:
+        json.dump(registry, f, indent=2)
 
 
 @click.command()
@@ -41,12 +90,22 @@ default_globus_group = "OpenCosmo"
     default=default_globus_group,
     help="Globus Group name for compute function registration",
 )
+@click.option(
+    "--registry-file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    default=None,
+    help="Output path of the function registry "
+    f"[default: {function_registry_root}/<system>.json]",
+)
 @click.argument(
     "system",
     type=click.Choice(["polaris", "perlmutter", "defiant"]),
 )
-def cli(reset_tokens: bool, globus_group: str, system: str):
+def cli(reset_tokens: bool, globus_group: str, registry_file: Path | None, system: str):
     endpoint_template_dir = endpoint_template_root / system
+    if registry_file is None:
+        registry_file = function_registry_root / f"{system}.json"
+    registry_file.parent.mkdir(parents=True, exist_ok=True)
     # Compute Endpoints
     compute_client = globus_compute_sdk.Client()
     endpoints = compute_client.get_endpoints()
@@ -102,6 +161,13 @@ def cli(reset_tokens: bool, globus_group: str, system: str):
             config += f"  - {compute_function.globus_uuid}  # {compute_function.slug}\n"
         with open(output_path, "w") as f:
             f.write(config)
+
+    print(f"Writing function registry to {registry_file}")
+    write_function_registry(
+        registry_file,
+        system,
+        list(endpoint_template_dir.glob("*.yaml")),
+    )
     print(f"{bcolors.WARNING}MAKE SURE TO RESTART THE ENDPOINTS!{bcolors.ENDC}")
 
     for config_path in endpoint_template_dir.glob("*.yaml"):
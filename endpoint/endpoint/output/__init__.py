@@ -1,3 +1,14 @@
+from datasets.result_index import get_index_request
+
+from .cache import get_cache_key, lookup_cached_result
 from .files import get_working_directory, handle_output
+from .runner import run_streaming
 
-__all__ = ["get_working_directory", "handle_output"]
+__all__ = [
+    "get_cache_key",
+    "get_index_request",
+    "get_working_directory",
+    "handle_output",
+    "lookup_cached_result",
+    "run_streaming",
+]
@@ -0,0 +1,7 @@
+# Entry point of the finalizer process (see `finalize.start_finalizer`). Not part of
+# finalize.py: `endpoint.output` imports that module, so running it with `python -m`
+# would import it twice.
+from .finalize import run_finalizer
+
+if __name__ == "__main__":
+    run_finalizer()
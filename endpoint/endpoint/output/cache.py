@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from datasets.result_index import get_cache_key, publish_result, unpublish_results
+
+from .files import get_result, get_result_directory
+from .publish import publish_file
+from .settings import OUTPUT_CONFIG
+
+_entry_filename = "entry.json"
+
+
+def get_cache_directory(compute_function: str) -> Path:
+    return OUTPUT_CONFIG.cache_base / compute_function
+
+
+def _link(source: Path, target: Path):
+    try:
+        os.link(source, target)
+    except OSError:
+        # e.g. across file systems, the entry is dropped once the source is removed
+        os.symlink(source, target)
+
+
+def _remove_entry(entry_directory: Path) -> None:
+    shutil.rmtree(entry_directory, ignore_errors=True)
+    if OUTPUT_CONFIG.cache_index is not None:
+        unpublish_results(OUTPUT_CONFIG.cache_index, [entry_directory.name])
+
+
+def _get_freeable_bytes(entry_directory: Path) -> int:
+    # the files are hardlinks, removing the entry only frees the files that are not
+    # linked anywhere else (e.g. in the result directory of a run)
+    nbytes = 0
+    for file in entry_directory.iterdir():
+        if file.name == _entry_filename or file.is_symlink():
+            continue
+        stat = file.stat()
+        if stat.st_nlink == 1:
+            nbytes += stat.st_size
+    return nbytes
+
+
+def lookup_cached_result(
+    compute_function: str,
+    run_uuid: str,
+    cache_key: str,
+    files_to_link: dict[str, str],
+    index_request: Optional[dict] = None,
+) -> Optional[dict[str, str]]:
+    """
+    Look up a previous result with the same `cache_key`. On a hit, the cached files
+    are linked into the result directory of this run, and the result dictionary (see
+    `handle_success`) is returned. Returns None if there is no (complete) result.
+    """
+    if not OUTPUT_CONFIG.cache_enabled:
+        return None
+    entry_directory = get_cache_directory(compute_function) / cache_key
+    entry_file = entry_directory / _entry_filename
+    if not entry_file.is_file():
+        return None
+    files = list(files_to_link.values())
+    # symlinked files (see `_link`) dangle once the run they point to is removed
+    if not all((entry_directory / f).is_file() for f in files):
+        _remove_entry(entry_directory)
+        return None
+
+    result_directory = get_result_directory(compute_function, run_uuid)
+    for file in files:
+        if not (result_directory / file).exists():
+            # a hardlink where possible, otherwise a copy, so that the published
+            # files never depend on the cache entry
+            publish_file(
+                (entry_directory / file).resolve(),
+                result_directory,
+                keep_source=True,
+                nthreads=OUTPUT_CONFIG.publish_threads,
+            )
+    # the modification time of the entry file tracks the last access (LRU)
+    entry_file.touch()
+    result = get_result(
+        compute_function, run_uuid, files_to_link, message="Cached result"
+    )
+    _publish_to_index(
+        compute_function, run_uuid, cache_key, files, index_request, result
+    )
+    return result
+
+
+def _publish_to_index(
+    compute_function: str,
+    run_uuid: str,
+    cache_key: str,
+    files: list[str],
+    index_request: Optional[dict],
+    result: dict[str, str],
+) -> None:
+    if index_request is None or OUTPUT_CONFIG.cache_index is None:
+        return
+    # the entry-point checks that the files of the run still exist before returning
+    # the result
+    result_directory = get_result_directory(compute_function, run_uuid)
+    try:
+        publish_result(
+            OUTPUT_CONFIG.cache_index,
+            cache_key,
+            index_request,
+            result,
+            [result_directory / file for file in files],
+        )
+    except ValueError as e:
+        # the result is still cached by this endpoint
+        logging.warning(f"Result not published to the cache index: {e}")
+
+
+def _create_entry(
+    compute_function: str,
+    run_uuid: str,
+    cache_key: str,
+    files_to_link: dict[str, str],
+):
+    cache_directory = get_cache_directory(compute_function)
+    result_directory = get_result_directory(compute_function, run_uuid)
+    # populate a temporary directory first, so that concurrent lookups never see a
+    # partial entry
+    tmp_directory = cache_directory / f".tmp-{cache_key}-{uuid.uuid4().hex}"
+    tmp_directory.mkdir(parents=True, mode=0o755)
+    for file in files_to_link.values():
+        _link(result_directory / file, tmp_directory / file)
+    with open(tmp_directory / _entry_filename, "w") as f:
+        json.dump(
+            {
+                "cache_key": cache_key,
+                "run_uuid": run_uuid,
+                "files": files_to_link,
+                "created_at": datetime.now().isoformat(),
+            },
+            f,
+        )
+    try:
+        tmp_directory.rename(cache_directory / cache_key)
+    except OSError:
+        # another run stored the same result in the meantime
+        shutil.rmtree(tmp_directory)
+
+
+def store_cached_result(
+    compute_function: str,
+    run_uuid: str,
+    cache_key: str,
+    files_to_link: dict[str, str],
+    index_request: Optional[dict] = None,
+) -> None:
+    """
+    Add the published files of a successful run to the result cache and evict the
+    least recently used entries if the cache is too large. If the `index_request`
+    (see `get_index_request`) is given and a shared cache index is configured, the
+    result is also published there under the compute function slug of the request,
+    so that the entry-point can answer equivalent requests directly.
+    """
+    if not OUTPUT_CONFIG.cache_enabled:
+        return
+    if not (get_cache_directory(compute_function) / cache_key).exists():
+        _create_entry(compute_function, run_uuid, cache_key, files_to_link)
+    _publish_to_index(
+        compute_function,
+        run_uuid,
+        cache_key,
+        list(files_to_link.values()),
+        index_request,
+        get_result(compute_function, run_uuid, files_to_link, "Cached result"),
+    )
+    evict_cached_results(compute_function)
+
+
+def evict_cached_results(
+    compute_function: str, max_bytes: Optional[int] = None
+) -> list[str]:
+    """
+    Remove the least recently used cache entries until the files that only the
+    cache of `compute_function` holds (i.e. that are not linked in a result
+    directory anymore) are smaller than `max_bytes` (default: cache_max_bytes).
+    Entries that would not free any space are kept. Returns the evicted cache keys.
+    """
+    if max_bytes is None:
+        max_bytes = OUTPUT_CONFIG.cache_max_bytes
+    entries = []
+    for entry_file in get_cache_directory(compute_function).glob(
+        f"*/{_entry_filename}"
+    ):
+        try:
+            entries.append(
+                (
+                    entry_file.stat().st_mtime,
+                    _get_freeable_bytes(entry_file.parent),
+                    entry_file.parent,
+                )
+            )
+        except OSError:
+            continue
+    entries.sort()
+    total_bytes = sum(nbytes for _, nbytes, _ in entries)
+    evicted = []
+    for _, nbytes, entry_directory in entries:
+        if total_bytes <= max_bytes:
+            break
+        if nbytes == 0:
+            continue
+        shutil.rmtree(entry_directory, ignore_errors=True)
+        total_bytes -= nbytes
+        evicted.append(entry_directory.name)
+    if OUTPUT_CONFIG.cache_index is not None:
+        unpublish_results(OUTPUT_CONFIG.cache_index, evicted)
+    return evicted
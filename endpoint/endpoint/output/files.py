@@ -1,25 +1,18 @@
 import os
-import shutil
 import subprocess
 from functools import cache
 from pathlib import Path
 from typing import Optional
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
-
-
-class OutputSettings(
-    BaseSettings
-):  # BaseSettings automatically pulls from the environment
-    model_config = SettingsConfigDict(env_prefix="hcp_")
-    result_collection_uuid: str
-    result_collection_path: str
-    result_collection_url: str
-    working_base: Path = Path("${HOME}/hacc_compute_portal_workdir")
-    result_base: Path = Path("${HOME}/hacc_compute_portal_results")
-
-
-OUTPUT_CONFIG = OutputSettings()
+from .finalize import (
+    Operation,
+    finalize,
+    publish_operation,
+    rmtree_operation,
+    store_cache_operation,
+)
+from .runner import StreamedProcess, get_logs_directory
+from .settings import OUTPUT_CONFIG
 
 
 @cache
@@ -32,10 +25,43 @@ def get_working_directory(compute_function: str, run_uuid: str) -> Path:
     return working_directory
 
 
+def get_result_directory(compute_function: str, run_uuid: str) -> Path:
+    """
+    Get the (published) result directory for a given compute function and run_uuid.
+    """
+    result_directory = OUTPUT_CONFIG.result_base / compute_function / run_uuid
+    result_directory.mkdir(parents=True, exist_ok=True, mode=0o755)
+    return result_directory
+
+
+def get_result(
+    compute_function: str,
+    run_uuid: str,
+    files_to_link: dict[str, str],
+    message: str = "",
+) -> dict[str, str]:
+    """
+    The result dictionary returned by a successful compute function, containing the
+    Globus collection information and the URLs of the files in `files_to_link`.
+    """
+    result = {
+        "status": "SUCCEEDED",
+        "message": message,
+        "collection_uuid": OUTPUT_CONFIG.result_collection_uuid,
+        "collection_path": f"{OUTPUT_CONFIG.result_collection_path}/{compute_function}/{run_uuid}",
+    }
+    for key, value in files_to_link.items():
+        result[f"{key}_url"] = (
+            OUTPUT_CONFIG.result_collection_url
+            + f"/{compute_function}/{run_uuid}/{value}"
+        )
+    return result
+
+
 def handle_output(
     compute_function: str,
     run_uuid: str,
-    process: subprocess.CompletedProcess,
+    process: subprocess.CompletedProcess | StreamedProcess,
     files_to_link: dict[str, str],
     *args,
     **kwargs,
@@ -51,9 +77,9 @@ def handle_output(
         outuput directories.
     run_uuid: str - The unique identifier for this run. This is used to determine
         working and output directories.
-    process: subprocess.CompletedProcess - Compute functions call subprocess.run to
-        execute the script that actually does the heavy lifting. Passing it in here
-        allows us to access the output and error streams.
+    process: subprocess.CompletedProcess - Compute functions call subprocess.run (or
+        `run_streaming`) to execute the script that actually does the heavy lifting.
+        Passing it in here allows us to access the output and error streams.
     files_to_link: dict[str, str] - A dictionary of files that will be moved to the
         output folders. Links to this files will be generated and returned, assuming the
         run was sucessful. Files are assumed to be in the working directory.
@@ -62,47 +88,69 @@ def handle_output(
         Which will result in the following entry in the output:
         {"name_url": "https://path/in/globus/filename.ext"}
         Which should be directly accessible to an authenticated user.
+
+    The file operations (publishing results and logs, cleaning up) are collected and
+    run at the end, the clean-up in a background process if `async_finalize` is set.
     """
-    log_urls = write_logs(compute_function, run_uuid, process)
+    operations: list[Operation] = []
+    log_urls = write_logs(compute_function, run_uuid, process, operations=operations)
     if process.returncode:
-        return handle_error(
+        result = handle_error(
             compute_function,
             run_uuid,
             process,
             log_urls,
             *args,
+            operations=operations,
             **kwargs,
         )
     else:
-        return handle_success(
-            compute_function, run_uuid, files_to_link, log_urls, *args, **kwargs
+        result = handle_success(
+            compute_function,
+            run_uuid,
+            files_to_link,
+            log_urls,
+            *args,
+            operations=operations,
+            **kwargs,
         )
+    finalize(operations)
+    return result
 
 
 def write_logs(
-    compute_function: str, run_uuid: str, process: subprocess.CompletedProcess
+    compute_function: str,
+    run_uuid: str,
+    process: subprocess.CompletedProcess | StreamedProcess,
+    *,
+    operations: Optional[list[Operation]] = None,
 ):
-    logs_directory = OUTPUT_CONFIG.result_base / "logs" / compute_function / run_uuid
+    logs_directory = get_logs_directory(compute_function, run_uuid)
     working_directory = get_working_directory(compute_function, run_uuid)
-    logs_directory.mkdir(parents=True, exist_ok=True, mode=0o755)
-    # TODO Put logs somewhere special
 
     log_url = (
         OUTPUT_CONFIG.result_collection_url + f"/logs/{compute_function}/{run_uuid}"
     )
 
     log_urls = {}
-    if process.stdout:
-        with open(logs_directory / "stdout.txt", "w") as f:
-            f.write(process.stdout)
-        log_urls.update({"stdout_url": log_url + "/stdout.txt"})
-    if process.stderr:
-        with open(logs_directory / "stderr.txt", "w") as f:
-            f.write(process.stderr)
-        log_urls.update({"stderr_url": log_url + "/stderr.txt"})
+    if isinstance(process, StreamedProcess):
+        # output has already been streamed to the logs directory
+        if process.stdout_file.is_file() and process.stdout_file.stat().st_size:
+            log_urls.update({"stdout_url": log_url + "/stdout.txt"})
+        if process.stderr_file.is_file() and process.stderr_file.stat().st_size:
+            log_urls.update({"stderr_url": log_url + "/stderr.txt"})
+    else:
+        if process.stdout:
+            with open(logs_directory / "stdout.txt", "w") as f:
+                f.write(process.stdout)
+            log_urls.update({"stdout_url": log_url + "/stdout.txt"})
+        if process.stderr:
+            with open(logs_directory / "stderr.txt", "w") as f:
+                f.write(process.stderr)
+            log_urls.update({"stderr_url": log_url + "/stderr.txt"})
     run_log = working_directory / "run.log"
     if run_log.exists():
-        shutil.move(run_log, logs_directory / "run.log")
+        _add_operation(operations, publish_operation(run_log, logs_directory))
         log_urls.update({"run_log_url": log_url + "/run.log"})
     return log_urls
 
@@ -110,9 +158,10 @@ def write_logs(
 def handle_error(
     compute_function: str,
     run_uuid: str,
-    process: subprocess.CompletedProcess,
+    process: subprocess.CompletedProcess | StreamedProcess,
     log_links: dict[str, str],
     *args,
+    operations: Optional[list[Operation]] = None,
     **kwargs,
 ):
     """
@@ -129,10 +178,13 @@ def handle_error(
             errormessage = f.read().strip()
         if errormessage:
             break
-        else:
-            errormessage = process.stderr.split("\n")[0]
+    if not errormessage:
+        # `process.stderr` may only be the tail of the output, the last line is the
+        # most likely to hold the actual error
+        lines = [line for line in process.stderr.splitlines() if line.strip()]
+        errormessage = lines[-1] if lines else ""
     os.chdir(working_directory.parent)
-    shutil.rmtree(working_directory)
+    _add_operation(operations, rmtree_operation(working_directory))
     return {
         "status": "FAILED",
         "message": errormessage,
@@ -146,20 +198,23 @@ def handle_success(
     files_to_link: dict[str, str],
     additional_links: Optional[dict[str, str]] = None,
     message: str = "",
+    cache_key: Optional[str] = None,
+    index_request: Optional[dict] = None,
     *args,
+    operations: Optional[list[Operation]] = None,
     **kwargs,
 ):
     """
     Handle the case where the job succeeded. This process will move the output files
-    to the result directory. It will generate links to any files that are passed in
-    the `files_to_link` argument. Additional links (currently used for logs) can be
-    provided in the `additional_links` argument. These links will simply be returned
-    as-is without modification.
+    to the result directory (see `publish_file`). It will generate links to any files
+    that are passed in the `files_to_link` argument. Additional links (currently used
+    for logs) can be provided in the `additional_links` argument. These links will
+    simply be returned as-is without modification. If a `cache_key` is given, the
+    results are added to the result cache (and published to the cache index, see
+    `store_cached_result`).
     """
     working_directory = get_working_directory(compute_function, run_uuid)
-    result_collection_directory = OUTPUT_CONFIG.result_base / compute_function
-    result_directory = result_collection_directory / run_uuid
-    result_directory.mkdir(parents=True, exist_ok=True, mode=0o755)
+    result_directory = get_result_directory(compute_function, run_uuid)
     os.chdir(result_directory)
 
     for file in files_to_link.values():
@@ -167,21 +222,28 @@ def handle_success(
             raise FileNotFoundError(
                 f"File {file} not found in working directory {working_directory}"
             )
-        shutil.copy(working_directory / file, result_directory)
-
-    shutil.rmtree(working_directory)
+        _add_operation(
+            operations, publish_operation(working_directory / file, result_directory)
+        )
 
-    result = {
-        "status": "SUCCEEDED",
-        "message": message,
-        "collection_uuid": OUTPUT_CONFIG.result_collection_uuid,
-        "collection_path": f"{OUTPUT_CONFIG.result_collection_path}/{compute_function}/{run_uuid}",
-    }
-    for key, value in files_to_link.items():
-        result[f"{key}_url"] = (
-            OUTPUT_CONFIG.result_collection_url
-            + f"/{compute_function}/{run_uuid}/{value}"
+    if cache_key is not None:
+        _add_operation(
+            operations,
+            store_cache_operation(
+                compute_function, run_uuid, cache_key, files_to_link, index_request
+            ),
         )
+    _add_operation(operations, rmtree_operation(working_directory))
+
+    result = get_result(compute_function, run_uuid, files_to_link, message)
     if additional_links:
         result = result | additional_links
     return result
+
+
+def _add_operation(operations: Optional[list[Operation]], operation: Operation):
+    # run the operation right away, unless it is collected by `handle_output`
+    if operations is None:
+        finalize([operation])
+    else:
+        operations.append(operation)
@@ -0,0 +1,184 @@
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from .publish import publish_file
+from .settings import OUTPUT_CONFIG
+
+# The finalization journal: every job is a json file with a list of (idempotent)
+# file operations and the number of operations already completed. A background
+# process works through the jobs, and picks up unfinished jobs after a crash.
+# Only the clean-up is deferred: background processes started within a batch job
+# are killed when the allocation ends, so the journal may also be worked through by
+# a process outside of the batch jobs (`python -m endpoint.output._finalize_worker`,
+# e.g. periodically on a login node).
+Operation = dict
+
+
+def get_journal_directory() -> Path:
+    journal_directory = OUTPUT_CONFIG.result_base / ".finalize"
+    journal_directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+    return journal_directory
+
+
+def publish_operation(source: Path, target_directory: Path) -> Operation:
+    return {
+        "op": "publish",
+        "source": str(source),
+        "target_directory": str(target_directory),
+    }
+
+
+def rmtree_operation(path: Path) -> Operation:
+    return {"op": "rmtree", "path": str(path)}
+
+
+def store_cache_operation(
+    compute_function: str,
+    run_uuid: str,
+    cache_key: str,
+    files_to_link: dict[str, str],
+    index_request: Optional[dict] = None,
+) -> Operation:
+    return {
+        "op": "store_cache",
+        "compute_function": compute_function,
+        "run_uuid": run_uuid,
+        "cache_key": cache_key,
+        "files_to_link": files_to_link,
+        "index_request": index_request,
+    }
+
+
+def run_operation(operation: Operation) -> None:
+    if operation["op"] == "publish":
+        source = Path(operation["source"])
+        target_directory = Path(operation["target_directory"])
+        if not source.exists() and (target_directory / source.name).exists():
+            # already published before a restart
+            return
+        target_directory.mkdir(parents=True, exist_ok=True, mode=0o755)
+        report = publish_file(
+            source, target_directory, nthreads=OUTPUT_CONFIG.publish_threads
+        )
+        print(f"Published {report}", flush=True)
+    elif operation["op"] == "rmtree":
+        shutil.rmtree(operation["path"], ignore_errors=True)
+    elif operation["op"] == "store_cache":
+        from .cache import store_cached_result
+
+        store_cached_result(
+            operation["compute_function"],
+            operation["run_uuid"],
+            operation["cache_key"],
+            operation["files_to_link"],
+            operation["index_request"],
+        )
+    else:
+        raise ValueError(f"Unknown finalization operation {operation['op']}")
+
+
+def _write_job(job_file: Path, job: dict) -> None:
+    tmp_file = job_file.with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(job, f)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp_file.replace(job_file)
+
+
+def run_job(job_file: Path) -> None:
+    with open(job_file) as f:
+        job = json.load(f)
+    operations = job["operations"]
+    for i in range(job["completed"], len(operations)):
+        try:
+            run_operation(operations[i])
+        except Exception:
+            job["error"] = traceback.format_exc()
+            failed_directory = job_file.parent / "failed"
+            failed_directory.mkdir(exist_ok=True)
+            _write_job(failed_directory / job_file.name, job)
+            job_file.unlink()
+            print(f"Finalization job {job_file.name} failed", flush=True)
+            return
+        job["completed"] = i + 1
+        _write_job(job_file, job)
+    job_file.unlink()
+
+
+def _pending_jobs(journal_directory: Path) -> list[Path]:
+    return sorted(journal_directory.glob("*.json"))
+
+
+def run_finalizer() -> None:
+    """
+    Work through all jobs in the journal. Only one finalizer runs at a time, the
+    function returns immediately if the journal is locked by another process.
+    """
+    journal_directory = get_journal_directory()
+    with open(journal_directory / ".lock", "w") as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            while jobs := _pending_jobs(journal_directory):
+                for job_file in jobs:
+                    run_job(job_file)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            # a job may have been added after the last check, while another
+            # finalizer failed to get the lock
+            if not _pending_jobs(journal_directory):
+                return
+
+
+def start_finalizer() -> None:
+    """Start a detached finalizer process if there are unfinished jobs"""
+    journal_directory = get_journal_directory()
+    if not _pending_jobs(journal_directory):
+        return
+    with open(journal_directory / "finalizer.log", "a") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "endpoint.output._finalize_worker"],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+
+def _is_deferred(operation: Operation) -> bool:
+    # the returned result links to the published files, and the cache may report
+    # them to later requests, so only the clean-up can happen after returning
+    return OUTPUT_CONFIG.async_finalize and operation["op"] == "rmtree"
+
+
+def finalize(operations: list[Operation]) -> None:
+    """
+    Run the file operations of a finished compute function. The results are always
+    published before returning. If `async_finalize` is set, removing the working
+    directory is written to the journal and run by a background process, so that
+    the compute function does not wait for it.
+    """
+    deferred = []
+    for operation in operations:
+        if _is_deferred(operation):
+            deferred.append(operation)
+        else:
+            run_operation(operation)
+    if not OUTPUT_CONFIG.async_finalize:
+        return
+    if deferred:
+        job_file = get_journal_directory() / f"{time.time_ns()}-{uuid.uuid4().hex}.json"
+        _write_job(job_file, {"operations": deferred, "completed": 0})
+    # also resumes jobs left over from a previous (crashed) finalizer
+    start_finalizer()
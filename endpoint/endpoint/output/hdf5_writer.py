@@ -0,0 +1,175 @@
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+import h5py
+import numpy as np
+from mpi4py import MPI
+
+from ..utils.data_fields import DataField
+
+WriterMode = Literal["auto", "mpio", "per-rank"]
+
+
+def get_part_filename(filename: Path, rank: int) -> Path:
+    """the file written by `rank` in per-rank mode, next to `filename`"""
+    return filename.with_name(f"{filename.stem}.rank{rank:05d}{filename.suffix}")
+
+
+def _write_nothing(dataset: h5py.Dataset) -> None:
+    # h5py skips the write of an empty selection, a rank without rows has to take
+    # part in a collective write explicitly (otherwise the other ranks hang)
+    buffer = np.empty((1, *dataset.shape[1:]), dtype=dataset.dtype)
+    memory_space = h5py.h5s.create_simple(buffer.shape)
+    memory_space.select_none()
+    file_space = dataset.id.get_space()
+    file_space.select_none()
+    dataset.id.write(memory_space, file_space, buffer, dxpl=dataset._dxpl)
+
+
+class ParallelHDF5Writer:
+    """
+    Writes columns contributed by all MPI ranks to a single HDF5 file. Every rank
+    passes its own rows, the rows are concatenated in rank order.
+
+    mode:
+        "mpio": collective writes to one file (requires h5py built with MPI)
+        "per-rank": every rank writes its own file (see `get_part_filename`), rank 0
+            merges them into `filename` on close (`chunk_rows` at a time) and
+            removes them. The merge is serial, only a fallback for h5py without MPI.
+        "auto": "mpio" if available, otherwise "per-rank"
+
+    Datasets are chunked along the rows with `chunk_rows` and optionally compressed
+    (e.g. `compression="gzip"`). Units and descriptions of the `DataField`s are
+    stored as attributes. Use as a context manager, or call `close` on all ranks.
+    """
+
+    def __init__(
+        self,
+        filename: str | Path,
+        comm: MPI.Comm = MPI.COMM_WORLD,
+        *,
+        mode: WriterMode = "auto",
+        chunk_rows: int = 1 << 16,
+        compression: Optional[str] = None,
+        compression_opts: Any = None,
+    ):
+        if mode == "auto":
+            mode = "mpio" if h5py.get_config().mpi else "per-rank"
+        self.filename = Path(filename)
+        self.comm = comm
+        self.mode = mode
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.compression_opts = compression_opts
+        # per-rank mode: the datasets and attributes rank 0 merges on close
+        self._datasets: list[tuple[str, np.dtype, tuple, list[int]]] = []
+        self._attributes: list[tuple[str, str, dict[str, Any]]] = []
+
+        if mode == "mpio":
+            self._file = h5py.File(self.filename, "w", driver="mpio", comm=comm)
+        elif mode == "per-rank":
+            self._file = h5py.File(get_part_filename(self.filename, comm.rank), "w")
+        else:
+            raise ValueError(f"Unknown HDF5 writer mode {mode}")
+
+    def __enter__(self) -> "ParallelHDF5Writer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _dataset_options(self, shape: tuple) -> dict[str, Any]:
+        if shape[0] == 0:
+            return {}
+        return {
+            "chunks": (min(self.chunk_rows, shape[0]), *shape[1:]),
+            "compression": self.compression,
+            "compression_opts": self.compression_opts,
+        }
+
+    def _set_field_attributes(self, path: str, field: DataField) -> None:
+        attributes: dict[str, Any] = {"description": field.description}
+        if field.units is not None:
+            attributes["units"] = field.units
+        if self.mode == "mpio":
+            self._file[path].attrs.update(attributes)
+        else:
+            self._attributes.append(("dataset", path, attributes))
+
+    def set_attributes(self, attributes: dict[str, Any], group: str = "/") -> None:
+        """sets attributes of a group (e.g. the task parameters), collective"""
+        if self.mode == "mpio":
+            self._file.require_group(group).attrs.update(attributes)
+        else:
+            self._attributes.append(("group", group, attributes))
+
+    def write_columns(
+        self,
+        group: str,
+        fields: list[DataField],
+        columns: dict[str, np.ndarray],
+    ) -> None:
+        """
+        Writes the local rows of the `fields` (by output name) to `group`. Collective,
+        all ranks need to pass the same fields with the same dtypes.
+        """
+        counts = self.comm.allgather(len(columns[fields[0].output_name]))
+        offset = sum(counts[: self.comm.rank])
+        total = sum(counts)
+        for field in fields:
+            data = np.ascontiguousarray(columns[field.output_name])
+            dtypes = self.comm.allgather((data.dtype.str, data.shape[1:]))
+            if any(d != dtypes[0] for d in dtypes):
+                raise ValueError(
+                    f"Field {field.output_name} has different dtypes / shapes on "
+                    f"different ranks: {set(dtypes)}"
+                )
+            path = f"{group}/{field.output_name}"
+            if self.mode == "mpio":
+                shape = (total, *data.shape[1:])
+                dataset = self._file.create_dataset(
+                    path, shape=shape, dtype=data.dtype, **self._dataset_options(shape)
+                )
+                with dataset.collective:
+                    if len(data) > 0:
+                        dataset[offset : offset + len(data)] = data
+                    else:
+                        _write_nothing(dataset)
+            else:
+                self._file.create_dataset(
+                    path, data=data, **self._dataset_options(data.shape)
+                )
+                self._datasets.append((path, data.dtype, data.shape[1:], counts))
+            self._set_field_attributes(path, field)
+
+    def _merge_part_files(self) -> None:
+        with h5py.File(self.filename, "w") as f:
+            for path, dtype, row_shape, counts in self._datasets:
+                shape = (sum(counts), *row_shape)
+                f.create_dataset(
+                    path, shape=shape, dtype=dtype, **self._dataset_options(shape)
+                )
+            for kind, path, attributes in self._attributes:
+                target = f[path] if kind == "dataset" else f.require_group(path)
+                target.attrs.update(attributes)
+            offsets = {path: 0 for path, *_ in self._datasets}
+            for rank in range(self.comm.size):
+                part_filename = get_part_filename(self.filename, rank)
+                with h5py.File(part_filename, "r") as part:
+                    for path, _, _, counts in self._datasets:
+                        source, target = part[path], f[path]
+                        offset = offsets[path]
+                        for start in range(0, counts[rank], self.chunk_rows):
+                            stop = min(start + self.chunk_rows, counts[rank])
+                            target[offset + start : offset + stop] = source[start:stop]
+                        offsets[path] += counts[rank]
+                part_filename.unlink()
+
+    def close(self) -> None:
+        """closes the file(s), collective"""
+        self._file.close()
+        if self.mode == "per-rank":
+            self.comm.Barrier()
+            if self.comm.rank == 0:
+                self._merge_part_files()
+        self.comm.Barrier()
@@ -0,0 +1,167 @@
+import errno
+import fcntl
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+# ioctl request to clone (reflink) a file on Linux (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+class PublishReport(NamedTuple):
+    file: str
+    # "rename", "hardlink", "reflink", "copy", "parallel-copy" or "existing"
+    method: str
+    nbytes: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """throughput in bytes / second"""
+        return self.nbytes / self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"{self.file}: {self.method}, {self.nbytes / 1024**2:.1f} MiB in "
+            f"{self.seconds:.2f}s ({self.throughput / 1024**2:.1f} MiB/s)"
+        )
+
+
+def _reflink(source: Path, target: Path) -> bool:
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            ok = False
+        else:
+            ok = True
+    if not ok:
+        target.unlink()
+    return ok
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int, buffer_size: int):
+    end = offset + count
+    try:
+        while offset < end:
+            copied = os.copy_file_range(src_fd, dst_fd, end - offset, offset, offset)
+            if copied == 0:
+                raise OSError(errno.EIO, "unexpected end of file")
+            offset += copied
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+            raise
+        # copy_file_range not supported between these file systems
+        while offset < end:
+            data = os.pread(src_fd, min(buffer_size, end - offset), offset)
+            if not data:
+                raise OSError(errno.EIO, "unexpected end of file")
+            offset += os.pwrite(dst_fd, data, offset)
+
+
+def parallel_copy(
+    source: Path,
+    target: Path,
+    *,
+    nthreads: int = 8,
+    chunk_size: int = 256 * 1024**2,
+    buffer_size: int = 16 * 1024**2,
+) -> None:
+    """Copy a file in `chunk_size` pieces using `nthreads` concurrent threads"""
+    size = source.stat().st_size
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(dst_fd, size)
+            offsets = range(0, size, chunk_size)
+            with ThreadPoolExecutor(max_workers=nthreads) as executor:
+                futures = [
+                    executor.submit(
+                        _copy_range,
+                        src_fd,
+                        dst_fd,
+                        offset,
+                        min(chunk_size, size - offset),
+                        buffer_size,
+                    )
+                    for offset in offsets
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copymode(source, target)
+
+
+def publish_file(
+    source: Path,
+    target_directory: Path,
+    *,
+    keep_source: bool = False,
+    nthreads: int = 8,
+    chunk_size: int = 256 * 1024**2,
+) -> PublishReport:
+    """
+    Move (or copy, if `keep_source` is set) a file into `target_directory`, using
+    the cheapest available method:
+
+    - same file system: `os.rename` (or a hardlink if the source is kept)
+    - reflink, where the file system supports it
+    - a single `shutil.copyfile` for files smaller than `chunk_size`
+    - a parallel, chunked copy (`copy_file_range`) for large files
+
+    An existing target is replaced atomically, unless it already is the source file
+    (e.g. a hardlink published before).
+    """
+    target = target_directory / source.name
+    nbytes = source.stat().st_size
+    start = time.perf_counter()
+
+    if target.exists() and os.path.samefile(source, target):
+        # writing to the target would truncate the source
+        if not keep_source and source.absolute() != target.absolute():
+            source.unlink()
+        return PublishReport(source.name, "existing", nbytes, 0.0)
+
+    # hardlinks and copies are created under a temporary name, an existing target is
+    # never opened for writing
+    tmp_target = target_directory / f".{source.name}.{uuid.uuid4().hex}.tmp"
+    method = None
+    if source.stat().st_dev == target_directory.stat().st_dev:
+        try:
+            if keep_source:
+                os.link(source, tmp_target)
+                os.replace(tmp_target, target)
+                method = "hardlink"
+            else:
+                os.replace(source, target)
+                method = "rename"
+        except OSError:
+            tmp_target.unlink(missing_ok=True)
+    if method is None:
+        try:
+            if _reflink(source, tmp_target):
+                method = "reflink"
+            elif nbytes < chunk_size:
+                shutil.copyfile(source, tmp_target)
+                shutil.copymode(source, tmp_target)
+                method = "copy"
+            else:
+                parallel_copy(
+                    source, tmp_target, nthreads=nthreads, chunk_size=chunk_size
+                )
+                method = "parallel-copy"
+            os.replace(tmp_target, target)
+        finally:
+            tmp_target.unlink(missing_ok=True)
+        if not keep_source:
+            source.unlink()
+
+    return PublishReport(source.name, method, nbytes, time.perf_counter() - start)
@@ -0,0 +1,126 @@
+import gzip
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import IO
+
+from .settings import OUTPUT_CONFIG
+
+
+class StreamedProcess:
+    """
+    Result of `run_streaming`. Compatible with `subprocess.CompletedProcess` as used
+    by `handle_output`, but `stdout` and `stderr` only contain the last lines of the
+    output. The full output is in `stdout_file` and `stderr_file` (and their rotated
+    backups).
+    """
+
+    def __init__(
+        self,
+        args: list[str],
+        returncode: int,
+        stdout: str,
+        stderr: str,
+        stdout_file: Path,
+        stderr_file: Path,
+    ):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.stdout_file = stdout_file
+        self.stderr_file = stderr_file
+
+
+def get_logs_directory(compute_function: str, run_uuid: str) -> Path:
+    logs_directory = OUTPUT_CONFIG.result_base / "logs" / compute_function / run_uuid
+    logs_directory.mkdir(parents=True, exist_ok=True, mode=0o755)
+    return logs_directory
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _open_log(path: Path, compress: bool) -> RotatingFileHandler:
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=OUTPUT_CONFIG.log_max_bytes,
+        backupCount=OUTPUT_CONFIG.log_backup_count,
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.terminator = ""
+    if compress:
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def _pump(stream: IO[str], handler: RotatingFileHandler, tail: deque):
+    for line in stream:
+        handler.emit(logging.makeLogRecord({"msg": line}))
+        tail.append(line)
+    stream.close()
+    handler.close()
+
+
+def run_streaming(
+    compute_function: str,
+    run_uuid: str,
+    args: list[str],
+    *,
+    compress: bool | None = None,
+) -> StreamedProcess:
+    """
+    Run a command (e.g. via mpiexec / srun) and stream its stdout and stderr to
+    (size-rotated, optionally gzip-compressed) log files in the logs directory of
+    this run. Only the last `log_tail_lines` lines of each stream are kept in memory
+    for error messages.
+    """
+    if compress is None:
+        compress = OUTPUT_CONFIG.log_compress
+    logs_directory = get_logs_directory(compute_function, run_uuid)
+    stdout_file = logs_directory / "stdout.txt"
+    stderr_file = logs_directory / "stderr.txt"
+    stdout_tail: deque[str] = deque(maxlen=OUTPUT_CONFIG.log_tail_lines)
+    stderr_tail: deque[str] = deque(maxlen=OUTPUT_CONFIG.log_tail_lines)
+
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    pumps = [
+        threading.Thread(
+            target=_pump,
+            args=(process.stdout, _open_log(stdout_file, compress), stdout_tail),
+        ),
+        threading.Thread(
+            target=_pump,
+            args=(process.stderr, _open_log(stderr_file, compress), stderr_tail),
+        ),
+    ]
+    for pump in pumps:
+        pump.start()
+    returncode = process.wait()
+    for pump in pumps:
+        pump.join()
+
+    return StreamedProcess(
+        args,
+        returncode,
+        "".join(stdout_tail),
+        "".join(stderr_tail),
+        stdout_file,
+        stderr_file,
+    )
@@ -0,0 +1,38 @@
+from pathlib import Path
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class OutputSettings(
+    BaseSettings
+):  # BaseSettings automatically pulls from the environment
+    model_config = SettingsConfigDict(env_prefix="hcp_")
+    result_collection_uuid: str
+    result_collection_path: str
+    result_collection_url: str
+    working_base: Path = Path("${HOME}/hacc_compute_portal_workdir")
+    result_base: Path = Path("${HOME}/hacc_compute_portal_results")
+    # Result cache, least recently used results are evicted once the files only
+    # held by the cache exceed cache_max_bytes. Not published, but should be on the
+    # same file system as result_base, so that cached files are hardlinks.
+    cache_enabled: bool = True
+    cache_base: Path = Path("${HOME}/hacc_compute_portal_cache")
+    cache_max_bytes: int = 500 * 1024**3
+    # Shared SQLite index of cached results, queried by the entry-point. Must be
+    # located on a file system that the entry-point can read.
+    cache_index: Optional[Path] = None
+    # Number of threads used to copy large result files across file systems
+    publish_threads: int = 8
+    # Clean up the working directory in a background process (see finalize.py),
+    # instead of blocking the worker. Result files and logs are always published
+    # before the compute function returns.
+    async_finalize: bool = False
+    # Streaming of stdout / stderr to log files (see runner.py)
+    log_max_bytes: int = 100 * 1024**2
+    log_backup_count: int = 10
+    log_compress: bool = False
+    log_tail_lines: int = 200
+
+
+OUTPUT_CONFIG = OutputSettings()
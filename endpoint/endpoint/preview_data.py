@@ -1,15 +1,103 @@
+import base64
 import json
+import logging
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Optional
+from pathlib import Path
+from typing import Any, Literal, NamedTuple, Optional
 
-from plotly.graph_objects import Figure
-from pydantic import BaseModel, ConfigDict, PlainSerializer
+import numpy as np
+from plotly.graph_objects import Figure, Heatmap, Scatter
+from plotly.io.json import to_json_plotly
+from pydantic import BaseModel, ConfigDict, PlainSerializer, SerializationInfo
 from typing_extensions import Annotated
 
+from .utils.downsample import bin_points, lttb_indices, quantize
+from .utils.timing import Timer
+
+# "json": arrays as lists of numbers, "base64": arrays as base64 typed arrays
+# ({dtype, bdata}, supported by plotly.js >= 2.28)
+ArrayEncoding = Literal["json", "base64"]
+
+# integer types of plotly.js typed arrays, plotly.js has no 64 bit integers
+_TYPED_ARRAY_INTEGERS = ["i1", "u1", "i2", "u2", "i4", "u4"]
+
+
+def _to_typed_array_type(values: np.ndarray) -> Optional[np.ndarray]:
+    # the values in a type of plotly.js typed arrays, None if they don't fit exactly
+    if values.dtype.kind in "iu" and values.dtype.itemsize == 8:
+        lo, hi = values.min(initial=0), values.max(initial=0)
+        for dtype in _TYPED_ARRAY_INTEGERS:
+            if np.iinfo(dtype).min <= lo and hi <= np.iinfo(dtype).max:
+                return values.astype(dtype)
+        as_float = values.astype(np.float64)
+        # beyond 2**53, not every integer is a float64
+        with np.errstate(invalid="ignore"):
+            exact = np.array_equal(as_float.astype(values.dtype), values)
+        return as_float if exact else None
+    if values.dtype == np.float16:
+        return values.astype(np.float32)
+    return values
+
+
+def encode_typed_array(values: np.ndarray) -> dict[str, str]:
+    """
+    The base64 typed array `{dtype, bdata[, shape]}` of a numeric array, directly
+    from its buffer. 64 bit integers are stored with the smallest integer type
+    that fits (float64 if they are exactly representable, a ValueError otherwise),
+    float16 as float32.
+    """
+    converted = _to_typed_array_type(np.asarray(values))
+    if converted is None:
+        raise ValueError("64 bit integers can't be stored exactly as a typed array")
+    values = np.ascontiguousarray(converted, dtype=converted.dtype.newbyteorder("<"))
+    spec = {
+        "dtype": values.dtype.str[1:],
+        "bdata": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+    if values.ndim > 1:
+        spec["shape"] = ", ".join(str(n) for n in values.shape)
+    return spec
+
+
+def _to_jsonable(value: Any, array_encoding: ArrayEncoding) -> Any:
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v, array_encoding) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v, array_encoding) for v in value]
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        if array_encoding == "base64" and value.ndim and value.dtype.kind != "b":
+            converted = _to_typed_array_type(value)
+            if converted is not None:
+                return encode_typed_array(converted)
+        # exact (Python) ints for 64 bit integers
+        return value.tolist()
+    if isinstance(value, np.generic) and value.dtype.kind in "biuf":
+        return value.item()
+    # anything else (dates, timedeltas, strings, pandas objects, ...) through the
+    # plotly JSON encoder
+    return json.loads(to_json_plotly(value))
+
+
+def encode_figure(figure: Figure, array_encoding: ArrayEncoding = "json") -> dict:
+    """the JSON-compatible dict of `figure`, with the numpy arrays of the traces
+    encoded as `array_encoding`. The figure is not serialized to JSON, the typed
+    arrays and lists go straight into the output of the pydantic serializer.
+    """
+    return _to_jsonable(figure.to_dict(), array_encoding)
+
+
+def _serialize_figure(figure: Figure, info: SerializationInfo) -> dict:
+    context = info.context or {}
+    return encode_figure(figure, context.get("array_encoding", "json"))
+
+
 # TODO: add actual validation
 AnnotatedPlotlyFigure = Annotated[
     Figure,
-    PlainSerializer(lambda f: json.loads(f.to_json())),
+    PlainSerializer(_serialize_figure),
 ]
 
 
@@ -30,3 +118,235 @@ class PreviewData(BaseModel):
     plots: list[PlotData]
     date: datetime
     inputData: dict
+
+
+def serialize_preview(
+    preview_data: PreviewData, array_encoding: ArrayEncoding = "json"
+) -> str:
+    """the JSON of the preview, with the trace arrays encoded as `array_encoding`"""
+    return preview_data.model_dump_json(context={"array_encoding": array_encoding})
+
+
+def get_preview_size(
+    preview_data: PreviewData, array_encoding: ArrayEncoding = "json"
+) -> int:
+    """size of the serialized preview in bytes"""
+    return len(serialize_preview(preview_data, array_encoding).encode())
+
+
+class _PendingPlot(NamedTuple):
+    kind: Literal["line", "scatter", "figure"]
+    title: str
+    description: str
+    x: Optional[np.ndarray] = None
+    y: Optional[np.ndarray] = None
+    name: Optional[str] = None
+    layout: Optional[dict[str, Any]] = None
+    figure: Optional[Figure] = None
+
+
+class PreviewBuilder:
+    """
+    Collects the plots of a preview and reduces their data so that the serialized
+    `PreviewData` stays below `max_bytes`.
+
+    Lines (`add_line`) are downsampled with LTTB, scatter plots (`add_scatter`) are
+    shown as a 2D histogram (heatmap) if they have too many points, and the floats
+    of both are rounded to `significant_digits` (down to `min_significant_digits`).
+    Figures added with `add_figure` are kept as they are, but count against the
+    budget, the largest ones are dropped (with a warning) if the preview doesn't fit
+    otherwise. The size is measured with the trace arrays encoded as `array_encoding`,
+    which needs to be used for `serialize_preview` as well. With "base64", the
+    rounded floats are stored as float32.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 1_000_000,
+        *,
+        significant_digits: int = 6,
+        min_significant_digits: int = 3,
+        min_points: int = 16,
+        array_encoding: ArrayEncoding = "json",
+    ):
+        self.max_bytes = max_bytes
+        self.significant_digits = significant_digits
+        self.min_significant_digits = min_significant_digits
+        self.min_points = min_points
+        self.array_encoding = array_encoding
+        self._plots: list[_PendingPlot] = []
+
+    def add_line(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        *,
+        title: str,
+        description: str,
+        name: Optional[str] = None,
+        layout: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """adds a line plot, `x` should be ordered"""
+        x, y = np.asarray(x), np.asarray(y)
+        finite = np.isfinite(x) & np.isfinite(y)
+        self._plots.append(
+            _PendingPlot("line", title, description, x[finite], y[finite], name, layout)
+        )
+
+    def add_scatter(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        *,
+        title: str,
+        description: str,
+        name: Optional[str] = None,
+        layout: Optional[dict[str, Any]] = None,
+    ) -> None:
+        x, y = np.asarray(x), np.asarray(y)
+        finite = np.isfinite(x) & np.isfinite(y)
+        self._plots.append(
+            _PendingPlot(
+                "scatter", title, description, x[finite], y[finite], name, layout
+            )
+        )
+
+    def add_figure(self, figure: Figure, *, title: str, description: str) -> None:
+        """adds a figure that is not reduced (e.g. a histogram)"""
+        self._plots.append(_PendingPlot("figure", title, description, figure=figure))
+
+    def _reduce_precision(self, values: np.ndarray, digits: int) -> np.ndarray:
+        values = quantize(values, digits)
+        if self.array_encoding == "base64" and values.dtype.kind == "f" and digits <= 7:
+            # the text length doesn't matter for typed arrays, the item size does
+            return values.astype(np.float32)
+        return values
+
+    def _render(self, plot: _PendingPlot, max_points: int, digits: int) -> PlotData:
+        if plot.kind == "figure":
+            return PlotData(
+                plotly_data=plot.figure, title=plot.title, description=plot.description
+            )
+        assert plot.x is not None and plot.y is not None
+        if plot.kind == "line":
+            indices = lttb_indices(plot.x, plot.y, max_points)
+            trace = Scatter(
+                x=self._reduce_precision(plot.x[indices], digits),
+                y=self._reduce_precision(plot.y[indices], digits),
+                mode="lines",
+                name=plot.name,
+            )
+        elif len(plot.x) <= max_points:
+            trace = Scatter(
+                x=self._reduce_precision(plot.x, digits),
+                y=self._reduce_precision(plot.y, digits),
+                mode="markers",
+                name=plot.name,
+            )
+        else:
+            # every cell of the histogram costs about as much as a point
+            nbins = max(int(np.sqrt(2 * max_points)), 2)
+            x_centers, y_centers, counts = bin_points(plot.x, plot.y, nbins)
+            trace = Heatmap(
+                x=self._reduce_precision(x_centers, digits),
+                y=self._reduce_precision(y_centers, digits),
+                z=counts,
+                name=plot.name,
+                colorbar={"title": "Count"},
+            )
+        figure = Figure(trace)
+        figure.update_layout(template="plotly_white", **(plot.layout or {}))
+        return PlotData(
+            plotly_data=figure, title=plot.title, description=plot.description
+        )
+
+    def build(
+        self,
+        input_data: dict,
+        date: Optional[datetime] = None,
+        *,
+        timer: Optional[Timer] = None,
+    ) -> PreviewData:
+        """
+        Creates the `PreviewData` with the largest number of points (and digits)
+        per plot that fits into `max_bytes`. The serializations of the size checks
+        are timed as "preview serialization" with `timer`.
+
+        If the preview doesn't fit even with `min_points` points per plot, figures
+        added with `add_figure` are dropped, largest first. Without any figures left,
+        the oversized preview is returned. Both are logged as warnings.
+        """
+        return self._build(input_data, date, timer)[0]
+
+    def write(
+        self,
+        path: str | Path,
+        input_data: dict,
+        date: Optional[datetime] = None,
+        *,
+        timer: Optional[Timer] = None,
+    ) -> PreviewData:
+        """
+        Like `build`, and writes the preview to `path`. The JSON of the last size
+        check is written, the preview is not serialized again.
+        """
+        # not streamed: the size check needs the complete JSON anyway, and it is
+        # bounded by max_bytes
+        preview_data, data = self._build(input_data, date, timer)
+        with timer.section("preview write") if timer else nullcontext():
+            with open(path, "wb") as f:
+                f.write(data)
+        return preview_data
+
+    def _build(
+        self, input_data: dict, date: Optional[datetime], timer: Optional[Timer]
+    ) -> tuple[PreviewData, bytes]:
+        date = date or datetime.now()
+        digits = self.significant_digits
+        plots = list(self._plots)
+        nreduced = sum(plot.kind != "figure" for plot in plots)
+        # initial guess: two numbers of (digits + sign, point, separator) or of
+        # 4 bytes in base64 per point
+        value_bytes = 6 if self.array_encoding == "base64" else digits + 3
+        max_points = max(
+            self.max_bytes // (2 * value_bytes * max(nreduced, 1)), self.min_points
+        )
+        while True:
+            preview_data = PreviewData(
+                plots=[self._render(p, max_points, digits) for p in plots],
+                date=date,
+                inputData=input_data,
+            )
+            with timer.section("preview serialization") if timer else nullcontext():
+                data = serialize_preview(preview_data, self.array_encoding).encode()
+            size = len(data)
+            if size <= self.max_bytes:
+                return preview_data, data
+            if max_points <= self.min_points or nreduced == 0:
+                figures = [i for i, plot in enumerate(plots) if plot.kind == "figure"]
+                if not figures:
+                    logging.warning(
+                        f"Preview has {size} bytes with {max_points} points per plot, "
+                        f"more than the limit of {self.max_bytes} bytes"
+                    )
+                    return preview_data, data
+                figure_sizes = {
+                    i: len(
+                        preview_data.plots[i].model_dump_json(
+                            context={"array_encoding": self.array_encoding}
+                        )
+                    )
+                    for i in figures
+                }
+                largest = max(figures, key=figure_sizes.__getitem__)
+                logging.warning(
+                    f"Dropping figure {plots[largest].title!r} "
+                    f"({figure_sizes[largest]} bytes) from the preview of {size} "
+                    f"bytes, the limit is {self.max_bytes} bytes"
+                )
+                del plots[largest]
+                continue
+            digits = max(digits - 1, self.min_significant_digits)
+            max_points = max(
+                int(0.9 * max_points * self.max_bytes / size), self.min_points
+            )
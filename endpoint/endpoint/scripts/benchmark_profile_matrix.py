@@ -0,0 +1,69 @@
+import time
+
+import click
+import numpy as np
+
+from endpoint.utils.profile_matrix import ProfileMatrixEngine, get_profilematrix
+
+
+def create_synthetic_catalog(
+    nhalos: int, nbins: int, requested_fraction: float, seed: int
+) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """Random halo tags with complete, shuffled profiles and a sorted request"""
+    rng = np.random.default_rng(seed)
+    halo_tags = np.cumsum(rng.integers(1, 1000, size=nhalos, dtype=np.int64))
+    order = rng.permutation(nhalos * nbins)
+    profiles: dict[str, np.ndarray] = {
+        "fof_halo_bin_tag": np.repeat(halo_tags, nbins)[order],
+        "sod_halo_bin": np.tile(np.arange(nbins, dtype=np.int64), nhalos)[order],
+        "sod_halo_bin_mass": rng.random(nhalos * nbins, dtype=np.float32),
+    }
+    nrequested = max(1, int(requested_fraction * nhalos))
+    sorted_tags = np.sort(rng.choice(halo_tags, size=nrequested, replace=False))
+    return profiles, sorted_tags
+
+
+@click.command()
+@click.option("--nhalos", type=int, default=1_000_000, show_default=True)
+@click.option("--nbins", type=int, default=20, show_default=True)
+@click.option(
+    "--requested-fraction",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Fraction of halos for which profiles are requested",
+)
+@click.option("--repeat", type=int, default=3, show_default=True)
+@click.option("--seed", type=int, default=42, show_default=True)
+def cli(nhalos: int, nbins: int, requested_fraction: float, repeat: int, seed: int):
+    """Compare the profile matrix engines on a synthetic profile catalog"""
+    profiles, sorted_tags = create_synthetic_catalog(
+        nhalos, nbins, requested_fraction, seed
+    )
+    print(
+        f"{nhalos} halos x {nbins} bins ({nhalos * nbins} profile rows), "
+        f"{len(sorted_tags)} requested"
+    )
+
+    engines: list[ProfileMatrixEngine] = ["searchsorted", "sort"]
+    results = {}
+    for engine in engines:
+        # first call includes the numba compilation
+        results[engine] = get_profilematrix(profiles, sorted_tags, engine=engine)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            get_profilematrix(profiles, sorted_tags, engine=engine)
+            timings.append(time.perf_counter() - start)
+        print(
+            f"  {engine:12s}: best {min(timings):.3f}s, "
+            f"mean {np.mean(timings):.3f}s ({repeat} runs)"
+        )
+
+    for k in profiles:
+        if not np.array_equal(results["searchsorted"][k], results["sort"][k]):
+            raise RuntimeError(f"Engines disagree on profile field {k}")
+
+
+if __name__ == "__main__":
+    cli()
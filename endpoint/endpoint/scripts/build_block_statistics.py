@@ -0,0 +1,39 @@
+import click
+
+from endpoint.datasets import datasets
+from endpoint.utils.catalog_filter import (
+    build_block_statistics,
+    get_block_statistics_path,
+)
+from endpoint.utils.catalog_reader import open_catalog
+
+
+@click.command()
+@click.option("--dataset", type=click.Choice(list(datasets.keys())), required=True)
+@click.option("--catalog", type=str, required=True, help="Catalog type, e.g. halos")
+@click.option(
+    "--column",
+    "columns",
+    type=str,
+    multiple=True,
+    required=True,
+    help="Column (input name) to compute the per-block min/max of",
+)
+@click.option("--block-size", type=int, default=1 << 20, show_default=True)
+def cli(dataset: str, catalog: str, columns: tuple[str, ...], block_size: int):
+    """Precompute per-block min/max statistics used to skip blocks in filtered reads"""
+    dset = datasets[dataset]
+    if catalog not in dset.catalogs:
+        raise click.BadParameter(
+            f"Dataset {dataset} has no catalog {catalog}", param_hint="catalog"
+        )
+    path = get_block_statistics_path(dset, catalog)
+    statistics = build_block_statistics(
+        open_catalog(dset.catalogs[catalog]), list(columns), block_size, path
+    )
+    nblocks = len(next(iter(statistics.values())))
+    print(f"{catalog}: {nblocks} blocks of {block_size} rows -> {path}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,50 @@
+import click
+import numpy as np
+
+from endpoint.datasets import datasets
+from endpoint.utils.catalog_reader import (
+    get_column_mapping,
+    get_sidecar_path,
+    open_catalog,
+)
+from endpoint.utils.data_fields import halo_lc_fields
+from endpoint.utils.lightcone_index import build_sky_index, save_sky_index
+
+
+@click.command()
+@click.option("--dataset", type=click.Choice(list(datasets.keys())), required=True)
+@click.option("--catalog", type=str, default="halos_lc", show_default=True)
+@click.option("--nlat", type=int, default=64, show_default=True)
+@click.option("--nlon", type=int, default=128, show_default=True)
+@click.option(
+    "--nshells",
+    type=int,
+    default=32,
+    show_default=True,
+    help="Number of comoving distance shells (equal width)",
+)
+def cli(dataset: str, catalog: str, nlat: int, nlon: int, nshells: int):
+    """Precompute the angular (sky pixel) and radial (shell) index of a lightcone"""
+    dset = datasets[dataset]
+    if catalog not in dset.catalogs:
+        raise click.BadParameter(
+            f"Dataset {dataset} has no catalog {catalog}", param_hint="catalog"
+        )
+    source = open_catalog(dset.catalogs[catalog])
+    input_names = get_column_mapping(halo_lc_fields)
+    theta = source.read(input_names["theta"])
+    phi = source.read(input_names["phi"])
+    chi = source.read(input_names["chi"])
+    shell_edges = np.linspace(chi.min(), np.nextafter(chi.max(), np.inf), nshells + 1)
+
+    index = build_sky_index(theta, phi, chi, shell_edges, nlat, nlon)
+    index_directory = get_sidecar_path(dset, catalog, "sky_index")
+    save_sky_index(index, index_directory)
+    print(
+        f"{catalog}: {len(index.order)} rows, {nshells} shells x {index.npixels} "
+        f"pixels -> {index_directory}"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,41 @@
+import time
+
+import click
+
+from endpoint.datasets import datasets
+from endpoint.utils.tag_index import (
+    build_tag_index,
+    get_tag_index_directory,
+    read_tags,
+)
+
+
+@click.command()
+@click.option("--dataset", type=click.Choice(list(datasets.keys())), required=True)
+@click.option(
+    "--catalog",
+    "catalogs",
+    type=str,
+    multiple=True,
+    help="Catalogs to index (default: all catalogs of the dataset)",
+)
+def cli(dataset: str, catalogs: tuple[str, ...]):
+    """Precompute the sorted tag indexes of the catalogs of a dataset"""
+    dset = datasets[dataset]
+    for catalog_name in catalogs or dset.catalogs.keys():
+        if catalog_name not in dset.catalogs:
+            raise click.BadParameter(
+                f"Dataset {dataset} has no catalog {catalog_name}", param_hint="catalog"
+            )
+        start = time.perf_counter()
+        tags = read_tags(dset.catalogs[catalog_name])
+        index_directory = get_tag_index_directory(dset, catalog_name)
+        index = build_tag_index(tags, index_directory)
+        print(
+            f"{catalog_name}: {len(index.order)} rows, {len(index.tags)} tags -> "
+            f"{index_directory} ({time.perf_counter() - start:.1f}s)"
+        )
+
+
+if __name__ == "__main__":
+    cli()
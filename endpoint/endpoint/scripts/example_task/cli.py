@@ -2,24 +2,38 @@ import logging  # TODO: maybe need a MPIFileHandler
 import os
 
 import click
+import numpy as np
 from mpi4py import MPI
 
 from endpoint.datasets import Dataset, datasets
+from endpoint.output.hdf5_writer import ParallelHDF5Writer
+from endpoint.utils.data_fields import DataField
 from endpoint.utils.error_handler import init_mpi_error_handler
+from endpoint.utils.preview_statistics import compute_preview_statistics
+from endpoint.utils.timing import Timer
 
 from .preview import create_preview_data
 
+# fmt: off
+example_fields: list[DataField] = [
+    DataField(input_name=None, output_name="rank", units=None, description="MPI rank that wrote the row"),
+    DataField(input_name=None, output_name="value", units="", description="Example value"),
+]
+# fmt: on
+
 
 @click.command()
 @click.option("--dataset", type=click.Choice(list(datasets.keys())), required=True)
 @click.option("--name", type=str, required=True, help="Name for hello world")
 @click.option("--option", is_flag=True, help="An example option")
+@click.option("--nrows", type=int, default=1000, help="Number of rows to write")
 @click.option("--output", type=str, required=True)
 @click.option("--log-file", type=click.Path(writable=True, dir_okay=False))
 def cli(
     dataset: str,
     name: str,
     option: bool,
+    nrows: int,
     output: str,
     log_file: str | None = None,
 ) -> None:
@@ -35,6 +49,7 @@ def cli(
     init_mpi_error_handler()
 
     comm = MPI.COMM_WORLD
+    timer = Timer()
     rank = comm.Get_rank()
     nranks = comm.Get_size()
 
@@ -43,6 +58,7 @@ def cli(
         logging.info(f"  dataset: {dataset}")
         logging.info(f"  name:     {name}")
         logging.info(f"  option:   {option}")
+        logging.info(f"  nrows:    {nrows}")
         logging.info(f"Running with {nranks} MPI ranks")
         logging.info(f"Working directory: {os.getcwd()}")
 
@@ -51,24 +67,37 @@ def cli(
     if rank == 0:
         logging.info("Done")
         logging.info("Writing file")
-        with open(output, "w") as f:
-            f.write(f"Hello {name} from rank {rank} of {nranks}!\n")
-            f.write(f"  Option is set: {option}\n")
-            f.write(f"  Dataset: {dset.name}\n")
+    # every rank contributes its share of the rows to the output
+    first, last = rank * nrows // nranks, (rank + 1) * nrows // nranks
+    columns = {
+        "rank": np.full(last - first, rank, dtype=np.int32),
+        "value": (np.arange(first, last) / max(nrows - 1, 1)).astype(np.float32),
+    }
+    with timer.section("write output"):
+        with ParallelHDF5Writer(output) as writer:
+            writer.set_attributes(
+                {"name": name, "option": option, "dataset": dset.name, "nranks": nranks}
+            )
+            writer.write_columns("data", example_fields, columns)
+
+    # reduced to rank 0, None on the other ranks
+    with timer.section("preview statistics"):
+        statistics = compute_preview_statistics(comm, {"value": columns["value"]})
 
     if rank == 0:
         logging.info("Creating preview data")
-        preview_data = create_preview_data(
+        create_preview_data(
             input_data={
                 "dataset": dataset,
                 "name": name,
                 "option": option,
             },
-            output_file=output,
+            preview_file="preview.json",
+            statistics=statistics,
+            timer=timer,
         )
-        with open("preview.json", "w") as f:
-            f.write(preview_data.model_dump_json())
         logging.info("Done")
+        timer.log_report()
 
     if MPI is not None:
         comm.Barrier()
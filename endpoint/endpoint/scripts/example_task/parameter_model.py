@@ -1,6 +1,6 @@
 from typing import List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from endpoint.datasets import DatasetField
 
 
@@ -8,6 +8,9 @@ class ExampleParameters(BaseModel):
     dataset: DatasetField
     name: str
     option: bool = False
+    # the entry-point selects the endpoint configuration by the number of rows, see
+    # `datasets.resources.estimate_example_resources`
+    nrows: int = Field(default=1000, ge=1)
 
     def to_cmd_args(self) -> List[str]:
         args = [
@@ -15,6 +18,8 @@ class ExampleParameters(BaseModel):
             self.dataset,
             "--name",
             str(self.name),
+            "--nrows",
+            str(self.nrows),
         ]
         if self.option:
             args.append("--option")
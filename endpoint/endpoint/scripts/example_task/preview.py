@@ -1,7 +1,12 @@
-from ...preview_data import PlotData, PreviewData
+from ...preview_data import ArrayEncoding, PreviewBuilder, PreviewData
+from ...utils.preview_statistics import FieldStatistics
+from ...utils.timing import Timer
 import plotly.graph_objects as go
 import numpy as np
-from datetime import datetime
+from typing import Optional
+
+# typed arrays need plotly.js >= 2.28 in the portal
+array_encoding: ArrayEncoding = "base64"
 
 
 def create_preview_figure(name: str, dataset: str) -> go.Figure:
@@ -18,19 +23,52 @@ def create_preview_figure(name: str, dataset: str) -> go.Figure:
     return fig
 
 
-def create_preview_data(input_data: dict, output_file: str) -> PreviewData:
-    fig = create_preview_figure(input_data["name"], input_data["dataset"])
-    plot_data = PlotData(
-        plotly_data=fig,
-        title=f"Preview for {input_data['name']} with dataset {input_data['dataset']}",
-        description=f"This is a preview of the example task with name {input_data['name']} and dataset {input_data['dataset']}.",
+def create_histogram_figure(field: str, statistics: FieldStatistics) -> go.Figure:
+    edges = np.array(statistics.bin_edges)
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(
+            x=0.5 * (edges[1:] + edges[:-1]),
+            y=statistics.histogram,
+            width=np.diff(edges),
+            name=field,
+        )
     )
-
-    preview_data = PreviewData(
-        plots=[plot_data], date=datetime.now(), inputData=input_data
+    fig.update_layout(
+        title=f"Distribution of {field}",
+        xaxis_title=f"log10({field})" if statistics.log else field,
+        yaxis_title="Count",
+        template="plotly_white",
     )
+    return fig
+
 
-    with open(output_file, "w") as f:
-        f.write(preview_data.json(indent=2))
+def create_preview_data(
+    input_data: dict,
+    preview_file: str = "preview.json",
+    statistics: Optional[dict[str, FieldStatistics]] = None,
+    *,
+    timer: Optional[Timer] = None,
+) -> PreviewData:
+    """builds the preview and writes it to `preview_file`, serialized only once"""
+    builder = PreviewBuilder(max_bytes=1_000_000, array_encoding=array_encoding)
+    builder.add_figure(
+        create_preview_figure(input_data["name"], input_data["dataset"]),
+        title=f"Preview for {input_data['name']} with dataset {input_data['dataset']}",
+        description=f"This is a preview of the example task with name {input_data['name']} and dataset {input_data['dataset']}.",
+    )
+    # histograms of the output, computed by all ranks (see compute_preview_statistics)
+    for field, field_statistics in (statistics or {}).items():
+        if not field_statistics.count:
+            continue
+        builder.add_figure(
+            create_histogram_figure(field, field_statistics),
+            title=f"Distribution of {field}",
+            description=(
+                f"{field_statistics.count} values, mean "
+                f"{field_statistics.mean:.4g}, median "
+                f"{field_statistics.quantiles[0.5]:.4g}"
+            ),
+        )
 
-    return preview_data
+    return builder.write(preview_file, input_data, timer=timer)
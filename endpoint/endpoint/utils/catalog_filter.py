@@ -0,0 +1,238 @@
+import warnings
+from pathlib import Path
+from typing import Annotated, Any, Iterator, Literal, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+from pydantic import BaseModel, Field
+
+from datasets import Dataset
+
+from .catalog_reader import (
+    AnyDataField,
+    ColumnSource,
+    get_column_mapping,
+    get_sidecar_path,
+)
+
+center_columns = ("fof_halo_center_x", "fof_halo_center_y", "fof_halo_center_z")
+
+# per-block (min, max) of each column, shape (nblocks, 2), ignoring NaN (NaN if all
+# values of the block are NaN)
+BlockStatistics = dict[str, npt.NDArray]
+
+
+class RangeFilter(BaseModel):
+    """`min <= column < max`, open-ended if a bound is None"""
+
+    kind: Literal["range"] = "range"
+    column: str
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return (self.column,)
+
+    def mask(self, data: dict[str, np.ndarray]) -> npt.NDArray[np.bool_]:
+        values = data[self.column]
+        mask = np.ones(len(values), dtype=bool)
+        if self.min is not None:
+            mask &= values >= self.min
+        if self.max is not None:
+            mask &= values < self.max
+        return mask
+
+    def may_match(self, bounds: dict[str, tuple[float, float]]) -> bool:
+        lo, hi = bounds[self.column]
+        return (self.min is None or hi >= self.min) and (
+            self.max is None or lo < self.max
+        )
+
+
+class BoxFilter(BaseModel):
+    """axis-aligned box `min <= position < max`"""
+
+    kind: Literal["box"] = "box"
+    min: tuple[float, float, float]
+    max: tuple[float, float, float]
+    columns: tuple[str, str, str] = center_columns
+
+    def mask(self, data: dict[str, np.ndarray]) -> npt.NDArray[np.bool_]:
+        mask = np.ones(len(data[self.columns[0]]), dtype=bool)
+        for column, lo, hi in zip(self.columns, self.min, self.max):
+            mask &= (data[column] >= lo) & (data[column] < hi)
+        return mask
+
+    def may_match(self, bounds: dict[str, tuple[float, float]]) -> bool:
+        return all(
+            bounds[column][1] >= lo and bounds[column][0] < hi
+            for column, lo, hi in zip(self.columns, self.min, self.max)
+        )
+
+
+class SphereFilter(BaseModel):
+    """`|position - center| <= radius`"""
+
+    kind: Literal["sphere"] = "sphere"
+    center: tuple[float, float, float]
+    radius: float
+    columns: tuple[str, str, str] = center_columns
+
+    def mask(self, data: dict[str, np.ndarray]) -> npt.NDArray[np.bool_]:
+        r2 = np.zeros(len(data[self.columns[0]]))
+        for column, c in zip(self.columns, self.center):
+            r2 += (data[column] - c) ** 2
+        return r2 <= self.radius**2
+
+    def may_match(self, bounds: dict[str, tuple[float, float]]) -> bool:
+        # distance from the center to the bounding box of the block
+        d2 = 0.0
+        for column, c in zip(self.columns, self.center):
+            lo, hi = bounds[column]
+            d2 += max(lo - c, 0.0, c - hi) ** 2
+        return d2 <= self.radius**2
+
+
+Predicate = Annotated[
+    Union[RangeFilter, BoxFilter, SphereFilter], Field(discriminator="kind")
+]
+
+
+def get_block_statistics_path(dataset: Dataset, catalog_name: str) -> Path:
+    return get_sidecar_path(dataset, catalog_name, "block_stats.npz")
+
+
+def build_block_statistics(
+    source: ColumnSource, columns: list[str], block_size: int, path: Path
+) -> BlockStatistics:
+    """computes the per-block nan-aware min/max of the (input) `columns` and stores
+    them"""
+    nrows = len(source)
+    statistics: BlockStatistics = {}
+    for column in columns:
+        bounds = np.empty((-(-nrows // block_size), 2))
+        for i, start in enumerate(range(0, nrows, block_size)):
+            data = source.read(column, slice(start, start + block_size))
+            with warnings.catch_warnings():
+                # all-NaN blocks
+                warnings.simplefilter("ignore", RuntimeWarning)
+                bounds[i] = np.nanmin(data), np.nanmax(data)
+        statistics[column] = bounds
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        # as Any, numpy's stubs match the unpacked arrays against `allow_pickle`
+        arrays: dict[str, Any] = {"block_size": block_size, **statistics}
+        np.savez(f, **arrays)
+    tmp_path.replace(path)
+    return statistics
+
+
+def load_block_statistics(path: Path) -> tuple[int, BlockStatistics]:
+    """the block size and statistics stored by `build_block_statistics`"""
+    with np.load(path) as f:
+        return int(f["block_size"]), {k: f[k] for k in f.files if k != "block_size"}
+
+
+def _iter_selected_blocks(
+    source: ColumnSource,
+    predicates: list[Predicate],
+    input_names: dict[str, str],
+    block_size: int,
+    statistics: Optional[BlockStatistics],
+) -> Iterator[tuple[slice, npt.NDArray[np.bool_], dict[str, np.ndarray]]]:
+    predicate_columns = {c for p in predicates for c in p.columns}
+    nrows = len(source)
+    for i, start in enumerate(range(0, nrows, block_size)):
+        block = slice(start, start + block_size)
+        if statistics is not None and all(
+            input_names[c] in statistics for c in predicate_columns
+        ):
+            bounds = {c: statistics[input_names[c]][i] for c in predicate_columns}
+            # NaN bounds (all-NaN blocks, or statistics that are not nan-aware) can't
+            # rule out a match, e.g. of an open-ended RangeFilter
+            if not any(np.isnan(b).any() for b in bounds.values()) and not all(
+                p.may_match(bounds) for p in predicates
+            ):
+                continue
+        data = {c: source.read(input_names[c], block) for c in predicate_columns}
+        mask = np.ones(min(block_size, nrows - start), dtype=bool)
+        for p in predicates:
+            mask &= p.mask(data)
+        if mask.any():
+            yield block, mask, {input_names[c]: d for c, d in data.items()}
+
+
+def read_filtered(
+    source: ColumnSource,
+    fields: list[AnyDataField],
+    predicates: list[Predicate],
+    *,
+    schema: Optional[list[AnyDataField]] = None,
+    block_size: int = 1 << 20,
+    statistics: Optional[tuple[int, BlockStatistics]] = None,
+) -> tuple[npt.NDArray[np.int64], dict[str, np.ndarray]]:
+    """reads the rows of a catalog matching all `predicates`, block by block
+
+    Parameters
+    ----------
+    fields:
+        the fields to read (see `catalog_reader.read_columns`)
+
+    predicates:
+        filters on the output names of the fields in `schema` (defaults to `fields`),
+        e.g. `RangeFilter(column="sod_halo_M200c", min=1e14)`
+
+    statistics:
+        the per-block statistics of the catalog (see `load_block_statistics`), blocks
+        that can't match are skipped without reading them. The statistics' block
+        size is used.
+
+    Returns
+    -------
+    the selected row indices and the columns of `fields` for those rows. Only one
+    block of the predicate and output columns is held in memory at a time, in
+    addition to the result.
+
+    """
+    input_names = get_column_mapping(schema if schema is not None else fields)
+    output_columns = get_column_mapping(fields)
+    unknown_columns = sorted(
+        {c for p in predicates for c in p.columns} - input_names.keys()
+    )
+    if unknown_columns:
+        raise ValueError(
+            f"Unknown filter column(s) {', '.join(unknown_columns)}, expected one of "
+            f"{', '.join(input_names)}"
+        )
+    block_statistics = None
+    if statistics is not None:
+        block_size, block_statistics = statistics
+        nblocks = -(-len(source) // block_size)
+        for column, bounds in block_statistics.items():
+            if len(bounds) != nblocks:
+                raise ValueError(
+                    f"Block statistics of column {column} have {len(bounds)} blocks, "
+                    f"expected {nblocks} (the statistics are out of date)"
+                )
+
+    rows = []
+    result: dict[str, list[np.ndarray]] = {k: [] for k in output_columns}
+    for block, mask, predicate_data in _iter_selected_blocks(
+        source, predicates, input_names, block_size, block_statistics
+    ):
+        rows.append(block.start + np.flatnonzero(mask))
+        for output_name, input_name in output_columns.items():
+            if input_name in predicate_data:
+                data = predicate_data[input_name]
+            else:
+                data = source.read(input_name, block)
+            result[output_name].append(data[mask])
+
+    return (
+        np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+        {
+            k: np.concatenate(v) if v else source.read(output_columns[k], slice(0, 0))
+            for k, v in result.items()
+        },
+    )
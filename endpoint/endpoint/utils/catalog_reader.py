@@ -0,0 +1,194 @@
+from pathlib import Path
+from typing import Optional, Protocol, Sequence, Union
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+
+from datasets import Catalog, Dataset
+
+from .data_fields import DataField, HydroParticleField, HydroParticleSGField
+
+Rows = Union[slice, npt.NDArray[np.int64], None]
+AnyDataField = Union[DataField, HydroParticleField, HydroParticleSGField]
+
+
+class ColumnSource(Protocol):
+    """a columnar catalog, individual columns can be read without the others"""
+
+    @property
+    def columns(self) -> list[str]: ...
+
+    def __len__(self) -> int: ...
+
+    def read(self, column: str, rows: Rows = None) -> np.ndarray: ...
+
+
+class NpyDirectorySource:
+    """a directory with one `<column>.npy` file per column, read memory-mapped"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @property
+    def columns(self) -> list[str]:
+        return sorted(
+            str(f.relative_to(self.path).with_suffix(""))
+            for f in self.path.rglob("*.npy")
+        )
+
+    def __len__(self) -> int:
+        return len(self._open(self.columns[0])) if self.columns else 0
+
+    def _open(self, column: str) -> np.ndarray:
+        return np.load(self.path / f"{column}.npy", mmap_mode="r")
+
+    def read(self, column: str, rows: Rows = None) -> np.ndarray:
+        data = self._open(column)
+        return np.array(data if rows is None else data[rows])
+
+
+class HDF5Source:
+    """a HDF5 file with one 1D dataset per column (in `group`)"""
+
+    def __init__(self, path: Path, group: str = "/"):
+        self.path = Path(path)
+        self.group = group
+
+    @property
+    def columns(self) -> list[str]:
+        columns: list[str] = []
+        with h5py.File(self.path, "r") as f:
+            f[self.group].visititems(
+                lambda name, obj: (
+                    columns.append(name) if isinstance(obj, h5py.Dataset) else None
+                )
+            )
+        return sorted(columns)
+
+    def __len__(self) -> int:
+        columns = self.columns
+        if not columns:
+            return 0
+        with h5py.File(self.path, "r") as f:
+            return len(f[self.group][columns[0]])
+
+    def read(self, column: str, rows: Rows = None) -> np.ndarray:
+        with h5py.File(self.path, "r") as f:
+            dataset = f[self.group][column]
+            if rows is None:
+                return dataset[:]
+            if isinstance(rows, slice):
+                return dataset[rows]
+            # h5py point selections need increasing indices
+            if len(rows) == 0:
+                return np.empty(0, dtype=dataset.dtype)
+            order = np.argsort(rows, kind="stable")
+            sorted_rows = rows[order]
+            unique_rows, inverse = np.unique(sorted_rows, return_inverse=True)
+            data = np.empty(len(rows), dtype=dataset.dtype)
+            data[order] = dataset[unique_rows][inverse]
+            return data
+
+
+def open_source(path: Union[str, Path], group: str = "/") -> ColumnSource:
+    path = Path(path)
+    if path.is_dir():
+        return NpyDirectorySource(path)
+    return HDF5Source(path, group)
+
+
+def open_catalog(catalog: Catalog) -> ColumnSource:
+    return open_source(catalog.path)
+
+
+def get_sidecar_path(dataset: Dataset, catalog_name: str, suffix: str) -> Path:
+    """where precomputed data (indexes, statistics) of a catalog is stored: in the
+    `index_directory` of the dataset if set, otherwise next to the catalog
+    """
+    if dataset.index_directory is not None:
+        return Path(dataset.index_directory) / f"{catalog_name}.{suffix}"
+    path = Path(dataset.catalogs[catalog_name].path)
+    return path.parent / f"{path.name}.{suffix}"
+
+
+def get_column_mapping(
+    fields: Sequence[AnyDataField], particle_type: Optional[str] = None
+) -> dict[str, str]:
+    """the `{output_name: input_name}` of the columns to read for `fields`
+
+    Fields inferred by the code (`input_name=None`) are skipped, as are
+    `HydroParticleField`s and `HydroParticleSGField`s that don't apply to
+    `particle_type`. `HydroParticleSGField`s are only read for a given particle type.
+    """
+    mapping = {}
+    for field in fields:
+        if isinstance(field, HydroParticleSGField):
+            if particle_type is None or particle_type not in field.output_name:
+                continue
+            mapping[field.output_name[particle_type]] = field.input_name
+        elif field.input_name is None:
+            continue
+        elif (
+            isinstance(field, HydroParticleField)
+            and particle_type is not None
+            and particle_type not in field.applies_to
+        ):
+            continue
+        else:
+            mapping[field.output_name] = field.input_name
+    return mapping
+
+
+def read_columns(
+    source: ColumnSource,
+    fields: list[AnyDataField],
+    *,
+    particle_type: Optional[str] = None,
+    rows: Rows = None,
+) -> dict[str, np.ndarray]:
+    """reads the columns of `fields` (only those) from `source`, renamed to their
+    `output_name`
+
+    Parameters
+    ----------
+    source:
+        the catalog to read from, see `open_source` / `open_catalog`
+
+    fields:
+        the fields to read, e.g. `halo_fields + halo_fields_hydro`
+
+    particle_type:
+        the type ("gas", "star", "agn", ...) of the particles in `rows`, selects the
+        hydro fields that apply and the names of the `HydroParticleSGField`s
+
+    rows:
+        the rows to read (a slice or an index array), all rows if None
+
+    """
+    return {
+        output_name: source.read(input_name, rows)
+        for output_name, input_name in get_column_mapping(fields, particle_type).items()
+    }
+
+
+def read_particles_by_type(
+    source: ColumnSource,
+    fields: list[AnyDataField],
+    particle_types: np.ndarray,
+) -> dict[str, dict[str, np.ndarray]]:
+    """reads a catalog with mixed particle types, split into one set of columns per
+    particle type
+
+    `particle_types` is the type of every row (e.g. derived from the particle mask).
+    Only the rows of each type are read, with the fields that apply to it.
+    """
+    return {
+        str(particle_type): read_columns(
+            source,
+            fields,
+            particle_type=str(particle_type),
+            rows=np.flatnonzero(particle_types == particle_type),
+        )
+        for particle_type in np.unique(particle_types)
+    }
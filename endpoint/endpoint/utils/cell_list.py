@@ -0,0 +1,235 @@
+from typing import NamedTuple, Optional
+
+import numba
+import numpy as np
+import numpy.typing as npt
+
+
+class CellList(NamedTuple):
+    """particles binned into a regular grid of cells covering `[lower, upper)`
+
+    The particles in cell `c` (flattened index) are `order[cell_start[c]:
+    cell_start[c + 1]]`, their positions (in the same order) are `x`, `y` and `z`.
+    Dimensions where the grid covers the full box are periodic, in the others
+    particles outside of the grid are assigned to the edge cells.
+    """
+
+    box_size: float
+    lower: npt.NDArray[np.float64]
+    cell_width: npt.NDArray[np.float64]
+    ncells: npt.NDArray[np.int64]
+    periodic: npt.NDArray[np.bool_]
+    cell_start: npt.NDArray[np.int64]
+    order: npt.NDArray[np.int64]
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+
+
+@numba.jit(nopython=True)
+def _cell_coordinate(x, lower, cell_width, ncells, periodic):
+    c = int(np.floor((x - lower) / cell_width))
+    if periodic:
+        return c % ncells
+    return min(max(c, 0), ncells - 1)
+
+
+@numba.jit(nopython=True)
+def _bin_particles(x, y, z, lower, cell_width, ncells, periodic, cell_start, order):
+    cell = np.empty(len(x), dtype=np.int64)
+    for i in range(len(x)):
+        cx = _cell_coordinate(x[i], lower[0], cell_width[0], ncells[0], periodic[0])
+        cy = _cell_coordinate(y[i], lower[1], cell_width[1], ncells[1], periodic[1])
+        cz = _cell_coordinate(z[i], lower[2], cell_width[2], ncells[2], periodic[2])
+        cell[i] = (cx * ncells[1] + cy) * ncells[2] + cz
+        cell_start[cell[i] + 1] += 1
+    for c in range(1, len(cell_start)):
+        cell_start[c] += cell_start[c - 1]
+    fill = cell_start[:-1].copy()
+    for i in range(len(x)):
+        order[fill[cell[i]]] = i
+        fill[cell[i]] += 1
+
+
+def build_cell_list(
+    x: np.ndarray,
+    y: np.ndarray,
+    z: np.ndarray,
+    box_size: float,
+    cell_size: float,
+    *,
+    lower: Optional[tuple[float, float, float]] = None,
+    upper: Optional[tuple[float, float, float]] = None,
+) -> CellList:
+    """bins the particles into cells of at least `cell_size` (ideally about the
+    typical query radius)
+
+    By default, the grid covers the full periodic box `[0, box_size)^3`. A smaller
+    region (e.g. the domain of an MPI rank plus its ghost zone) can be given with
+    `lower` and `upper`.
+    """
+    lower_ = np.zeros(3) if lower is None else np.asarray(lower, dtype=np.float64)
+    upper_ = np.full(3, box_size) if upper is None else np.asarray(upper, np.float64)
+    extent = upper_ - lower_
+    periodic = extent >= box_size
+    extent = np.minimum(extent, box_size)
+    ncells = np.maximum(np.floor(extent / cell_size), 1).astype(np.int64)
+    cell_width = extent / ncells
+
+    cell_start = np.zeros(np.prod(ncells) + 1, dtype=np.int64)
+    order = np.empty(len(x), dtype=np.int64)
+    _bin_particles(x, y, z, lower_, cell_width, ncells, periodic, cell_start, order)
+    return CellList(
+        float(box_size),
+        lower_,
+        cell_width,
+        ncells,
+        periodic,
+        cell_start,
+        order,
+        x[order],
+        y[order],
+        z[order],
+    )
+
+
+@numba.jit(nopython=True)
+def _cell_range(x, r, lower, cell_width, ncells, periodic):
+    # first cell and number of cells overlapping [x - r, x + r]
+    if periodic:
+        k = int(np.ceil(r / cell_width))
+        if 2 * k + 1 >= ncells:
+            return 0, ncells
+        return _cell_coordinate(x, lower, cell_width, ncells, True) - k, 2 * k + 1
+    first = _cell_coordinate(x - r, lower, cell_width, ncells, False)
+    last = _cell_coordinate(x + r, lower, cell_width, ncells, False)
+    return first, last - first + 1
+
+
+@numba.jit(nopython=True)
+def _periodic_delta(d, box_size):
+    return d - box_size * np.round(d / box_size)
+
+
+@numba.jit(nopython=True)
+def _query_center(
+    cx,
+    cy,
+    cz,
+    r,
+    box_size,
+    lower,
+    cell_width,
+    ncells,
+    periodic,
+    cell_start,
+    order,
+    x,
+    y,
+    z,
+    out,
+    out_start,
+):
+    # counts the neighbours, and writes them to `out` if `out_start >= 0`
+    r2 = r * r
+    x0, nx = _cell_range(cx, r, lower[0], cell_width[0], ncells[0], periodic[0])
+    y0, ny = _cell_range(cy, r, lower[1], cell_width[1], ncells[1], periodic[1])
+    z0, nz = _cell_range(cz, r, lower[2], cell_width[2], ncells[2], periodic[2])
+    n = 0
+    for a in range(nx):
+        ix = (x0 + a) % ncells[0]
+        for b in range(ny):
+            iy = (y0 + b) % ncells[1]
+            for c in range(nz):
+                iz = (z0 + c) % ncells[2]
+                cell = (ix * ncells[1] + iy) * ncells[2] + iz
+                for j in range(cell_start[cell], cell_start[cell + 1]):
+                    dx = _periodic_delta(x[j] - cx, box_size)
+                    dy = _periodic_delta(y[j] - cy, box_size)
+                    dz = _periodic_delta(z[j] - cz, box_size)
+                    if dx * dx + dy * dy + dz * dz <= r2:
+                        if out_start >= 0:
+                            out[out_start + n] = order[j]
+                        n += 1
+    return n
+
+
+@numba.jit(nopython=True, parallel=True)
+def _query_radius(
+    centers,
+    radii,
+    box_size,
+    lower,
+    cell_width,
+    ncells,
+    periodic,
+    cell_start,
+    order,
+    x,
+    y,
+    z,
+    offsets,
+    out,
+    count_only,
+):
+    # the first pass counts the neighbours (offsets[q + 1]), the second one fills out
+    for q in numba.prange(len(centers)):
+        n = _query_center(
+            centers[q, 0],
+            centers[q, 1],
+            centers[q, 2],
+            radii[q],
+            box_size,
+            lower,
+            cell_width,
+            ncells,
+            periodic,
+            cell_start,
+            order,
+            x,
+            y,
+            z,
+            out,
+            -1 if count_only else offsets[q],
+        )
+        if count_only:
+            offsets[q + 1] = n
+
+
+def query_radius(
+    cell_list: CellList,
+    centers: npt.NDArray[np.float64],
+    radii: float | npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """finds the particles within `radii` (periodic distance) of each of the
+    `centers` (shape `(n, 3)`), e.g. the halo centers and `sod_halo_R200c`
+
+    Returns
+    -------
+    the offsets and particle indices: the particles around `centers[i]` are
+    `indices[offsets[i]:offsets[i + 1]]` (indices into the arrays passed to
+    `build_cell_list`)
+
+    """
+    centers = np.ascontiguousarray(centers, dtype=np.float64).reshape(-1, 3)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), len(centers))
+    radii = np.ascontiguousarray(radii)
+    args = (
+        cell_list.box_size,
+        cell_list.lower,
+        cell_list.cell_width,
+        cell_list.ncells,
+        cell_list.periodic,
+        cell_list.cell_start,
+        cell_list.order,
+        cell_list.x,
+        cell_list.y,
+        cell_list.z,
+    )
+    offsets = np.zeros(len(centers) + 1, dtype=np.int64)
+    indices = np.empty(0, dtype=np.int64)
+    _query_radius(centers, radii, *args, offsets, indices, True)
+    np.cumsum(offsets, out=offsets)
+    indices = np.empty(offsets[-1], dtype=np.int64)
+    _query_radius(centers, radii, *args, offsets, indices, False)
+    return offsets, indices
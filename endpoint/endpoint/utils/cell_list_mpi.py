@@ -0,0 +1,140 @@
+import numpy as np
+import numpy.typing as npt
+from mpi4py import MPI
+
+from .cell_list import build_cell_list, query_radius
+from .mpi_exchange import alltoallv
+
+
+def _exchange_particles(
+    comm: MPI.Comm,
+    x: np.ndarray,
+    y: np.ndarray,
+    z: np.ndarray,
+    ids: np.ndarray,
+    box_size: float,
+    ghost_width: float,
+    replicate: bool,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # every rank owns a slab in x, and receives the particles in its slab and the
+    # ghost zone of width `ghost_width` around it (shifted across periodic boundaries)
+    nranks = comm.size
+    if replicate:
+        first = np.zeros(len(x), dtype=np.int64)
+        count = np.full(len(x), nranks, dtype=np.int64)
+    else:
+        slab_width = box_size / nranks
+        first = np.floor((x - ghost_width) / slab_width).astype(np.int64)
+        last = np.floor((x + ghost_width) / slab_width).astype(np.int64)
+        count = last - first + 1
+    particle = np.repeat(np.arange(len(x)), count)
+    slab = np.repeat(first, count) + (
+        np.arange(len(particle)) - np.repeat(np.cumsum(count) - count, count)
+    )
+    destination = slab % nranks
+    order = np.argsort(destination, kind="stable")
+    send_counts = np.bincount(destination, minlength=nranks).astype(np.int64)
+    particle = particle[order]
+    shift = np.floor_divide(slab[order], nranks) * box_size
+    return (
+        alltoallv(comm, x[particle] - shift, send_counts),
+        alltoallv(comm, y[particle], send_counts),
+        alltoallv(comm, z[particle], send_counts),
+        alltoallv(comm, ids[particle], send_counts),
+    )
+
+
+def _reorder_csr(
+    offsets: npt.NDArray[np.int64], values: np.ndarray, order: npt.NDArray[np.int64]
+) -> tuple[npt.NDArray[np.int64], np.ndarray]:
+    # moves the i-th segment of the CSR arrays to position order[i]
+    counts = np.diff(offsets)
+    new_counts = np.empty_like(counts)
+    new_counts[order] = counts
+    new_offsets = np.zeros_like(offsets)
+    np.cumsum(new_counts, out=new_offsets[1:])
+    target = np.repeat(new_offsets[order] - offsets[:-1], counts) + np.arange(
+        len(values)
+    )
+    new_values = np.empty_like(values)
+    new_values[target] = values
+    return new_offsets, new_values
+
+
+def query_radius_mpi(
+    comm: MPI.Comm,
+    x: np.ndarray,
+    y: np.ndarray,
+    z: np.ndarray,
+    ids: np.ndarray,
+    centers: npt.NDArray[np.float64],
+    radii: float | npt.NDArray[np.float64],
+    box_size: float,
+    cell_size: float,
+) -> tuple[npt.NDArray[np.int64], np.ndarray]:
+    """distributed version of `cell_list.query_radius`
+
+    Every rank passes its particles (in any decomposition) with their `ids` (e.g.
+    the particle id or a global row index) and its query `centers` / `radii`. The
+    box is split into slabs along x, each rank receives the particles of its slab
+    plus a ghost zone of the largest query radius, and answers the queries of the
+    centers in its slab.
+
+    Returns
+    -------
+    offsets and the ids of the particles around every center of this rank, the
+    particles around `centers[i]` are `ids[offsets[i]:offsets[i + 1]]`
+
+    Note
+    ----
+    Collective on `comm`.
+
+    """
+    centers = np.ascontiguousarray(centers, dtype=np.float64).reshape(-1, 3)
+    radii = np.ascontiguousarray(
+        np.broadcast_to(np.asarray(radii, dtype=np.float64), len(centers))
+    )
+    nranks = comm.size
+    rank = comm.rank
+    slab_width = box_size / nranks
+    ghost_width = comm.allreduce(np.max(radii, initial=0.0), op=MPI.MAX)
+    # with wide ghost zones, every rank needs all particles
+    replicate = 2 * ghost_width + slab_width >= box_size
+
+    local_x, local_y, local_z, local_ids = _exchange_particles(
+        comm, x, y, z, ids, box_size, ghost_width, replicate
+    )
+
+    # send the centers to the rank owning their slab
+    owner = np.floor(np.mod(centers[:, 0], box_size) / slab_width).astype(np.int64)
+    owner = np.minimum(owner, nranks - 1)
+    order = np.argsort(owner, kind="stable")
+    center_counts = np.bincount(owner, minlength=nranks).astype(np.int64)
+    local_centers = alltoallv(comm, centers[order], center_counts)
+    local_radii = alltoallv(comm, radii[order], center_counts)
+
+    if replicate:
+        cell_list = build_cell_list(local_x, local_y, local_z, box_size, cell_size)
+    else:
+        cell_list = build_cell_list(
+            local_x,
+            local_y,
+            local_z,
+            box_size,
+            cell_size,
+            lower=(rank * slab_width - ghost_width, 0.0, 0.0),
+            upper=((rank + 1) * slab_width + ghost_width, box_size, box_size),
+        )
+    offsets, indices = query_radius(cell_list, local_centers, local_radii)
+
+    # return the neighbours to the ranks that asked for them
+    recv_center_counts = np.empty_like(center_counts)
+    comm.Alltoall(center_counts, recv_center_counts)
+    source_end = np.cumsum(recv_center_counts)
+    neighbour_counts = offsets[source_end] - offsets[source_end - recv_center_counts]
+    counts = alltoallv(comm, np.diff(offsets), recv_center_counts)
+    neighbours = alltoallv(comm, local_ids[indices], neighbour_counts)
+
+    sent_offsets = np.zeros(len(centers) + 1, dtype=np.int64)
+    np.cumsum(counts, out=sent_offsets[1:])
+    return _reorder_csr(sent_offsets, neighbours, order)
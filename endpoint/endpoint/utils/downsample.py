@@ -0,0 +1,90 @@
+import numba
+import numpy as np
+import numpy.typing as npt
+
+
+@numba.jit(nopython=True)
+def _lttb(x: np.ndarray, y: np.ndarray, nout: int) -> np.ndarray:
+    n = len(x)
+    indices = np.empty(nout, dtype=np.int64)
+    indices[0] = 0
+    indices[nout - 1] = n - 1
+    # the inner points are split into nout - 2 buckets
+    edges = np.linspace(1.0, n - 1.0, nout - 1).astype(np.int64)
+    selected = 0
+    for i in range(nout - 2):
+        start, end = edges[i], edges[i + 1]
+        # the average of the next bucket (the last point for the last bucket)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < nout - 1 else n
+        next_x = 0.0
+        next_y = 0.0
+        for j in range(next_start, next_end):
+            next_x += x[j]
+            next_y += y[j]
+        next_x /= next_end - next_start
+        next_y /= next_end - next_start
+        # the point forming the largest triangle with the previous selected point
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs(
+                (x[selected] - next_x) * (y[j] - y[selected])
+                - (x[selected] - x[j]) * (next_y - y[selected])
+            )
+            if area > best_area:
+                best_area = area
+                best = j
+        indices[i + 1] = best
+        selected = best
+    return indices
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, nout: int) -> npt.NDArray[np.int64]:
+    """indices of `nout` points of the line (x, y) that preserve its visual shape
+    (largest triangle three buckets), `x` should be ordered
+    """
+    n = len(x)
+    if nout >= n:
+        return np.arange(n, dtype=np.int64)
+    if nout < 3:
+        return np.linspace(0, n - 1, max(nout, 0)).astype(np.int64)
+    return _lttb(
+        np.ascontiguousarray(x, dtype=np.float64),
+        np.ascontiguousarray(y, dtype=np.float64),
+        nout,
+    )
+
+
+def bin_points(
+    x: np.ndarray, y: np.ndarray, nbins: int
+) -> tuple[np.ndarray, np.ndarray, npt.NDArray[np.int64]]:
+    """number of points (x, y) in a grid of `nbins` x `nbins` cells spanning the
+    finite points, returns the cell centers along x and y and the counts[y, x]
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=nbins)
+    return (
+        0.5 * (x_edges[1:] + x_edges[:-1]),
+        0.5 * (y_edges[1:] + y_edges[:-1]),
+        counts.T.astype(np.int64),
+    )
+
+
+def quantize(values: np.ndarray, significant_digits: int) -> np.ndarray:
+    """rounds floating point `values` to `significant_digits` (other dtypes are
+    returned unchanged), so that their shortest decimal representation is short
+    """
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        return values
+    values = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        exponent = np.floor(np.log10(np.abs(values)))
+        shift = significant_digits - 1 - np.where(np.isfinite(exponent), exponent, 0)
+        # only multiply and divide by exact powers of ten
+        up = 10.0 ** np.clip(shift, 0, 308)
+        down = 10.0 ** np.clip(-shift, 0, 308)
+        return np.round(values * up / down) / up * down
@@ -0,0 +1,242 @@
+import json
+import shutil
+from pathlib import Path
+from typing import Annotated, Literal, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+import numpy.typing as npt
+from pydantic import BaseModel, Field
+
+from .catalog_reader import AnyDataField, ColumnSource, get_column_mapping
+from .data_fields import halo_lc_fields
+from .tag_join import join_ranges
+
+
+class SkyIndex(NamedTuple):
+    """lightcone rows sorted by (shell, sky pixel)
+
+    The sky is split into `nlat` bands of equal area (uniform in sin(latitude)) and
+    `nlon` longitude bins per band, the lightcone into radial shells with comoving
+    distance edges `shell_edges`. The rows in shell `s` and pixel `p` are
+    `order[start[s * npixels + p]:start[s * npixels + p + 1]]`.
+    """
+
+    nlat: int
+    nlon: int
+    shell_edges: npt.NDArray[np.float64]
+    order: npt.NDArray[np.int64]
+    start: npt.NDArray[np.int64]
+
+    @property
+    def npixels(self) -> int:
+        return self.nlat * self.nlon
+
+    def get_rows(
+        self, pixels: npt.NDArray[np.int64], shells: npt.NDArray[np.int64]
+    ) -> npt.NDArray[np.int64]:
+        """the (sorted) rows in the given pixels of the given shells"""
+        cells = (shells[:, None] * self.npixels + pixels[None, :]).ravel()
+        rows = join_ranges(self.order, self.start[cells], self.start[cells + 1]).rows
+        return np.sort(rows)
+
+
+def get_pixels(
+    theta: np.ndarray, phi: np.ndarray, nlat: int, nlon: int
+) -> npt.NDArray[np.int64]:
+    """the sky pixel of the longitudes `theta` and latitudes `phi` (radians)"""
+    band = np.floor((np.sin(phi) + 1) / 2 * nlat).astype(np.int64)
+    lon = np.floor(np.mod(theta, 2 * np.pi) / (2 * np.pi) * nlon).astype(np.int64)
+    return np.clip(band, 0, nlat - 1) * nlon + np.clip(lon, 0, nlon - 1)
+
+
+def _unit_vectors(theta: npt.ArrayLike, phi: npt.ArrayLike) -> np.ndarray:
+    theta, phi = np.asarray(theta), np.asarray(phi)
+    return np.stack(
+        [np.cos(phi) * np.cos(theta), np.cos(phi) * np.sin(theta), np.sin(phi)],
+        axis=-1,
+    )
+
+
+def _cap_pixels(
+    theta: float, phi: float, radius: float, nlat: int, nlon: int
+) -> npt.NDArray[np.int64]:
+    # pixels overlapping the spherical cap, conservative
+    lat_min = max(phi - radius, -np.pi / 2)
+    lat_max = min(phi + radius, np.pi / 2)
+    bands = np.arange(
+        int(np.floor((np.sin(lat_min) + 1) / 2 * nlat)),
+        min(int(np.floor((np.sin(lat_max) + 1) / 2 * nlat)), nlat - 1) + 1,
+    )
+    if lat_min <= -np.pi / 2 or lat_max >= np.pi / 2:
+        lons = np.arange(nlon)
+    else:
+        half_width = np.arcsin(min(np.sin(radius) / np.cos(phi), 1.0))
+        first = int(np.floor((theta - half_width) / (2 * np.pi) * nlon))
+        last = int(np.floor((theta + half_width) / (2 * np.pi) * nlon))
+        lons = np.unique(np.mod(np.arange(first, last + 1), nlon))
+    return (bands[:, None] * nlon + lons[None, :]).ravel()
+
+
+class ConeSelection(BaseModel):
+    """all objects within `radius` (radians) of (`theta`, `phi`)"""
+
+    kind: Literal["cone"] = "cone"
+    theta: float
+    phi: float
+    radius: float
+
+    def get_pixels(self, nlat: int, nlon: int) -> npt.NDArray[np.int64]:
+        return _cap_pixels(self.theta, self.phi, self.radius, nlat, nlon)
+
+    def mask(self, theta: np.ndarray, phi: np.ndarray) -> npt.NDArray[np.bool_]:
+        center = _unit_vectors(self.theta, self.phi)
+        return _unit_vectors(theta, phi) @ center >= np.cos(self.radius)
+
+
+class PolygonSelection(BaseModel):
+    """all objects inside a convex spherical polygon, with `vertices` as
+    (theta, phi) pairs (radians) connected by great circles
+    """
+
+    kind: Literal["polygon"] = "polygon"
+    vertices: list[tuple[float, float]] = Field(min_length=3)
+
+    def _geometry(self) -> tuple[np.ndarray, np.ndarray]:
+        vertices = _unit_vectors(*np.array(self.vertices).T)
+        center = vertices.sum(axis=0)
+        center /= np.linalg.norm(center)
+        normals = np.cross(vertices, np.roll(vertices, -1, axis=0))
+        # orient the edge normals towards the inside
+        normals *= np.sign(normals @ center)[:, None]
+        return center, normals
+
+    def get_pixels(self, nlat: int, nlon: int) -> npt.NDArray[np.int64]:
+        # the bounding cap around the polygon
+        center, _ = self._geometry()
+        vertices = _unit_vectors(*np.array(self.vertices).T)
+        radius = np.arccos(np.clip(vertices @ center, -1, 1)).max()
+        if radius >= np.pi / 2:
+            # the edges may leave the cap, don't restrict
+            return np.arange(nlat * nlon)
+        theta = np.arctan2(center[1], center[0])
+        phi = np.arcsin(np.clip(center[2], -1, 1))
+        return _cap_pixels(theta, phi, radius, nlat, nlon)
+
+    def mask(self, theta: np.ndarray, phi: np.ndarray) -> npt.NDArray[np.bool_]:
+        _, normals = self._geometry()
+        return np.all(_unit_vectors(theta, phi) @ normals.T >= 0, axis=-1)
+
+
+SkySelection = Annotated[
+    Union[ConeSelection, PolygonSelection], Field(discriminator="kind")
+]
+
+
+def build_sky_index(
+    theta: np.ndarray,
+    phi: np.ndarray,
+    chi: np.ndarray,
+    shell_edges: npt.NDArray[np.float64],
+    nlat: int,
+    nlon: int,
+) -> SkyIndex:
+    """sorts the lightcone by shell and sky pixel"""
+    shell_edges = np.asarray(shell_edges, dtype=np.float64)
+    nshells = len(shell_edges) - 1
+    shell = np.clip(np.searchsorted(shell_edges, chi, side="right") - 1, 0, nshells - 1)
+    cell = shell * (nlat * nlon) + get_pixels(theta, phi, nlat, nlon)
+    order = np.argsort(cell, kind="stable")
+    start = np.zeros(nshells * nlat * nlon + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=nshells * nlat * nlon), out=start[1:])
+    return SkyIndex(nlat, nlon, shell_edges, order, start)
+
+
+def save_sky_index(index: SkyIndex, index_directory: Path) -> None:
+    tmp_directory = index_directory.with_name(index_directory.name + ".tmp")
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    tmp_directory.mkdir(parents=True, mode=0o755)
+    with open(tmp_directory / "sky_index.json", "w") as f:
+        json.dump(
+            {
+                "nlat": index.nlat,
+                "nlon": index.nlon,
+                "shell_edges": index.shell_edges.tolist(),
+            },
+            f,
+        )
+    np.save(tmp_directory / "order.npy", index.order)
+    np.save(tmp_directory / "start.npy", index.start)
+    shutil.rmtree(index_directory, ignore_errors=True)
+    tmp_directory.rename(index_directory)
+
+
+def load_sky_index(index_directory: Path) -> SkyIndex:
+    """opens a sky index stored by `save_sky_index` (memory-mapped)"""
+    with open(index_directory / "sky_index.json") as f:
+        metadata = json.load(f)
+    return SkyIndex(
+        metadata["nlat"],
+        metadata["nlon"],
+        np.array(metadata["shell_edges"]),
+        np.load(index_directory / "order.npy", mmap_mode="r"),
+        np.load(index_directory / "start.npy", mmap_mode="r"),
+    )
+
+
+def select_lightcone(
+    source: ColumnSource,
+    index: SkyIndex,
+    fields: list[AnyDataField],
+    selection: Optional[SkySelection] = None,
+    *,
+    chi_min: Optional[float] = None,
+    chi_max: Optional[float] = None,
+    schema: Sequence[AnyDataField] = halo_lc_fields,
+) -> tuple[npt.NDArray[np.int64], dict[str, np.ndarray]]:
+    """reads the lightcone objects inside `selection` (the full sky if None) with
+    `chi_min <= chi < chi_max`
+
+    Only the rows in the shells and sky pixels overlapping the selection are read,
+    first the position columns (`theta`, `phi`, `chi` of the `schema`) for the exact
+    test, then the columns of `fields` for the selected rows.
+
+    Returns
+    -------
+    the selected row indices and the columns of `fields` for those rows
+
+    """
+    shell_edges = index.shell_edges
+    first_shell = (
+        0
+        if chi_min is None
+        else np.searchsorted(shell_edges, chi_min, side="right") - 1
+    )
+    last_shell = (
+        len(shell_edges) - 2
+        if chi_max is None
+        else np.searchsorted(shell_edges, chi_max, side="left") - 1
+    )
+    shells = np.arange(max(first_shell, 0), min(last_shell, len(shell_edges) - 2) + 1)
+    if selection is None:
+        pixels = np.arange(index.npixels)
+    else:
+        pixels = selection.get_pixels(index.nlat, index.nlon)
+    rows = index.get_rows(pixels, shells)
+
+    input_names = get_column_mapping(schema)
+    mask = np.ones(len(rows), dtype=bool)
+    if selection is not None:
+        theta = source.read(input_names["theta"], rows)
+        phi = source.read(input_names["phi"], rows)
+        mask &= selection.mask(theta, phi)
+    if chi_min is not None or chi_max is not None:
+        chi = source.read(input_names["chi"], rows)
+        if chi_min is not None:
+            mask &= chi >= chi_min
+        if chi_max is not None:
+            mask &= chi < chi_max
+    rows = rows[mask]
+    return rows, {
+        output_name: source.read(input_name, rows)
+        for output_name, input_name in get_column_mapping(fields).items()
+    }
@@ -0,0 +1,35 @@
+import numpy as np
+import numpy.typing as npt
+from mpi4py import MPI
+
+
+def alltoallv(
+    comm: MPI.Comm, data: np.ndarray, send_counts: npt.NDArray[np.int64]
+) -> np.ndarray:
+    """sends `send_counts[i]` consecutive rows of `data` to rank i
+
+    `data` needs to be ordered by destination rank. Rows may have a shape (e.g. the
+    bins of a profile matrix), which has to be the same on all ranks. Returns the
+    received rows, ordered by source rank.
+    """
+    data = np.ascontiguousarray(data)
+    row_bytes = data.dtype.itemsize * int(np.prod(data.shape[1:], dtype=np.int64))
+    recv_counts = np.empty_like(send_counts)
+    comm.Alltoall(send_counts, recv_counts)
+
+    recv = np.empty((recv_counts.sum(), *data.shape[1:]), dtype=data.dtype)
+    send_bytes = send_counts * row_bytes
+    recv_bytes = recv_counts * row_bytes
+    comm.Alltoallv(
+        [
+            data.view(np.uint8),
+            (send_bytes, np.cumsum(send_bytes) - send_bytes),
+            MPI.BYTE,
+        ],
+        [
+            recv.view(np.uint8),
+            (recv_bytes, np.cumsum(recv_bytes) - recv_bytes),
+            MPI.BYTE,
+        ],
+    )
+    return recv
@@ -0,0 +1,143 @@
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from mpi4py import MPI
+from pydantic import BaseModel
+
+
+class FieldStatistics(BaseModel):
+    """summary statistics and histogram of a field over all ranks, of log10(values)
+    if `log` is set
+    """
+
+    count: int
+    min: Optional[float]
+    max: Optional[float]
+    mean: Optional[float]
+    std: Optional[float]
+    log: bool
+    bin_edges: list[float]
+    histogram: list[int]
+    # approximate quantiles, from a finer histogram (sketch)
+    quantiles: dict[float, float]
+
+
+def _sketch_quantiles(
+    counts: np.ndarray, lo: float, hi: float, quantiles: list[float]
+) -> dict[float, float]:
+    # linear interpolation within the bins of the sketch histogram
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    edges = np.linspace(lo, hi, len(counts) + 1)
+    result = {}
+    for q in quantiles:
+        target = q * total
+        i = min(int(np.searchsorted(cumulative, target)), len(counts) - 1)
+        before = cumulative[i] - counts[i]
+        fraction = (target - before) / counts[i] if counts[i] else 0.0
+        result[q] = float(edges[i] + fraction * (edges[i + 1] - edges[i]))
+    return result
+
+
+def compute_preview_statistics(
+    comm: MPI.Comm,
+    columns: dict[str, np.ndarray],
+    *,
+    bins: int = 64,
+    log_fields: Optional[list[str]] = None,
+    quantiles: Optional[list[float]] = None,
+    sketch_bins: int = 4096,
+    root: Optional[int] = 0,
+) -> Optional[dict[str, FieldStatistics]]:
+    """
+    Computes the statistics of `columns` (the local rows of every rank) for the
+    preview, without gathering the data: each rank bins its rows, and the partial
+    histograms and moments are combined with `Reduce` to `root` (or `Allreduce` if
+    `root` is None). Non-finite values (and non-positive values of `log_fields`,
+    which are binned in log10) are ignored.
+
+    Returns the statistics by field name on `root` (all ranks if `root` is None),
+    None on the other ranks. Collective on `comm`.
+    """
+    log_fields = log_fields or []
+    quantiles = quantiles or [0.05, 0.25, 0.5, 0.75, 0.95]
+    names = list(columns.keys())
+
+    values = {}
+    for name in names:
+        data = np.asarray(columns[name], dtype=np.float64).ravel()
+        if name in log_fields:
+            data = np.log10(data[data > 0])
+        values[name] = data[np.isfinite(data)]
+
+    # the histogram range needs to be known on all ranks
+    local_min = np.array([np.min(values[n], initial=np.inf) for n in names])
+    local_max = np.array([np.max(values[n], initial=-np.inf) for n in names])
+    global_min = np.empty_like(local_min)
+    global_max = np.empty_like(local_max)
+    comm.Allreduce(local_min, global_min, op=MPI.MIN)
+    comm.Allreduce(local_max, global_max, op=MPI.MAX)
+
+    # one buffer for all fields: count, sum, sum of squares, histogram, sketch
+    nvalues = 3 + bins + sketch_bins
+    local = np.zeros((len(names), nvalues))
+    for i, name in enumerate(names):
+        data = values[name]
+        lo, hi = global_min[i], global_max[i]
+        if not len(data):
+            continue
+        if hi == lo:
+            hi = lo + 1.0
+        # moments relative to the minimum, for numerical stability
+        shifted = data - lo
+        local[i, 0] = len(data)
+        local[i, 1] = shifted.sum()
+        local[i, 2] = np.dot(shifted, shifted)
+        local[i, 3 : 3 + bins] = np.histogram(data, bins=bins, range=(lo, hi))[0]
+        local[i, 3 + bins :] = np.histogram(data, bins=sketch_bins, range=(lo, hi))[0]
+
+    merged: Optional[npt.NDArray[np.float64]]
+    if root is None:
+        merged = np.empty_like(local)
+        comm.Allreduce(local, merged, op=MPI.SUM)
+    else:
+        merged = np.empty_like(local) if comm.rank == root else None
+        comm.Reduce(local, merged, op=MPI.SUM, root=root)
+        if comm.rank != root:
+            return None
+    assert merged is not None
+
+    statistics = {}
+    for i, name in enumerate(names):
+        count = int(merged[i, 0])
+        lo, hi = global_min[i], global_max[i]
+        if count == 0:
+            statistics[name] = FieldStatistics(
+                count=0,
+                min=None,
+                max=None,
+                mean=None,
+                std=None,
+                log=name in log_fields,
+                bin_edges=[],
+                histogram=[],
+                quantiles={},
+            )
+            continue
+        if hi == lo:
+            hi = lo + 1.0
+        mean_shifted = merged[i, 1] / count
+        variance = max(merged[i, 2] / count - mean_shifted**2, 0.0)
+        statistics[name] = FieldStatistics(
+            count=count,
+            min=float(global_min[i]),
+            max=float(global_max[i]),
+            mean=float(lo + mean_shifted),
+            std=float(np.sqrt(variance)),
+            log=name in log_fields,
+            bin_edges=np.linspace(lo, hi, bins + 1).tolist(),
+            histogram=merged[i, 3 : 3 + bins].astype(np.int64).tolist(),
+            quantiles=_sketch_quantiles(merged[i, 3 + bins :], lo, hi, quantiles),
+        )
+    return statistics
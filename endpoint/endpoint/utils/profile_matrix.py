@@ -1,7 +1,12 @@
+from typing import Iterator, Literal, NamedTuple
+
+import h5py
 import numba
 import numpy as np
 import numpy.typing as npt
 
+ProfileMatrixEngine = Literal["searchsorted", "sort"]
+
 
 @numba.jit(nopython=True, parallel=True)
 def _get_profile_indices(
@@ -13,16 +18,120 @@ def _get_profile_indices(
     for j in numba.prange(len(profile_fof_tag)):
         tag = profile_fof_tag[j]
         test_idx = np.searchsorted(sorted_target_fof_tag, tag)
-        if sorted_target_fof_tag[test_idx] == tag:
+        if (
+            test_idx < len(sorted_target_fof_tag)
+            and sorted_target_fof_tag[test_idx] == tag
+        ):
             out_profile_indices[test_idx, profile_bin[j]] = j
 
 
+@numba.jit(nopython=True)
+def _merge_profile_indices(
+    sorted_profile_fof_tag,
+    sorted_profile_bin,
+    profile_order,
+    sorted_target_fof_tag,
+    out_profile_indices,
+):
+    # linear merge of two sorted tag arrays
+    i = 0
+    j = 0
+    while i < len(sorted_profile_fof_tag) and j < len(sorted_target_fof_tag):
+        tag = sorted_profile_fof_tag[i]
+        target_tag = sorted_target_fof_tag[j]
+        if tag < target_tag:
+            i += 1
+        elif tag > target_tag:
+            j += 1
+        else:
+            out_profile_indices[j, sorted_profile_bin[i]] = profile_order[i]
+            i += 1
+
+
+def get_profile_indices(
+    profile_tags: np.ndarray,
+    profile_bins: np.ndarray,
+    sorted_tags: npt.NDArray[np.int64],
+    nbins: int,
+    *,
+    engine: ProfileMatrixEngine = "searchsorted",
+) -> npt.NDArray[np.int64]:
+    """constructs the `(nhalos, nbins)` index matrix, -1 where there is no profile
+
+    Engines
+    -------
+    searchsorted:
+        binary search of every profile row in `sorted_tags` (numba parallel)
+
+    sort:
+        sorts the profile rows once by tag and merges them linearly with
+        `sorted_tags`. Sequential memory access and no binary searches, which pays
+        off when the profile rows are already (mostly) ordered by tag. Compare both
+        on a given system with the `benchmark-profile-matrix` script.
+
+    """
+    profile_indices = np.empty((len(sorted_tags), nbins), dtype=np.int64)
+    profile_indices[:] = -1
+    if engine == "searchsorted":
+        _get_profile_indices(profile_tags, profile_bins, sorted_tags, profile_indices)
+    elif engine == "sort":
+        order = np.argsort(profile_tags, kind="stable")
+        _merge_profile_indices(
+            profile_tags[order],
+            profile_bins[order],
+            order,
+            sorted_tags,
+            profile_indices,
+        )
+    else:
+        raise ValueError(f"Unknown profile matrix engine {engine}")
+    return profile_indices
+
+
+def _get_nbins(
+    profiles: dict[str, np.ndarray],
+    sorted_tags: npt.NDArray[np.int64],
+    profile_bin_idx_field: str,
+) -> int:
+    # make sure it's sorted
+    if not (
+        np.all(np.diff(sorted_tags) > 0)
+        and np.min(profiles[profile_bin_idx_field]) == 0
+    ):
+        raise RuntimeError("Error parsing halo profile data")
+    return int(np.max(profiles[profile_bin_idx_field])) + 1
+
+
+def _get_complete_profile_indices(
+    profiles: dict[str, np.ndarray],
+    sorted_tags: npt.NDArray[np.int64],
+    nbins: int,
+    *,
+    profile_halo_tag_field: str,
+    profile_bin_idx_field: str,
+    engine: ProfileMatrixEngine,
+) -> npt.NDArray[np.int64]:
+    profile_indices = get_profile_indices(
+        profiles[profile_halo_tag_field],
+        profiles[profile_bin_idx_field],
+        sorted_tags,
+        nbins,
+        engine=engine,
+    )
+    if np.any(profile_indices == -1):
+        print("DEBUG:", profile_indices, sorted_tags, nbins, flush=True)
+        raise RuntimeError("Error parsing halo profile data")
+
+    return profile_indices
+
+
 def get_profilematrix(
     profiles: dict[str, np.ndarray],
     sorted_tags: npt.NDArray[np.int64],
     *,
     profile_halo_tag_field: str = "fof_halo_bin_tag",
     profile_bin_idx_field: str = "sod_halo_bin",
+    engine: ProfileMatrixEngine = "searchsorted",
 ) -> dict[str, npt.NDArray[np.float32]]:
     """constructs an index matrix of shape `(nhalos, nbins)` for halo -> profile look-up
 
@@ -34,8 +143,8 @@ def get_profilematrix(
     sorted_tags:
         the halo tags (sorted ascending) for which to find profiles
 
-    nbins:
-        number of profile bins per halo
+    engine:
+        the algorithm used to match profiles to halos, see `get_profile_indices`
 
     Returns
     -------
@@ -50,24 +159,141 @@ def get_profilematrix(
     could not be found or is incomplete.
 
     """
-    # make sure it's sorted
-    if not (
-        np.all(np.diff(sorted_tags) > 0)
-        and np.min(profiles[profile_bin_idx_field]) == 0
-    ):
-        raise RuntimeError("Error parsing halo profile data")
-
-    nbins = np.max(profiles[profile_bin_idx_field]) + 1
-    profile_indices = np.empty((len(sorted_tags), nbins), dtype=np.int64)
-    profile_indices[:] = -1
-    _get_profile_indices(
-        profiles[profile_halo_tag_field],
-        profiles[profile_bin_idx_field],
+    profile_indices = _get_complete_profile_indices(
+        profiles,
         sorted_tags,
-        profile_indices,
+        _get_nbins(profiles, sorted_tags, profile_bin_idx_field),
+        profile_halo_tag_field=profile_halo_tag_field,
+        profile_bin_idx_field=profile_bin_idx_field,
+        engine=engine,
     )
-    if np.any(profile_indices == -1):
-        print("DEBUG:", profile_indices, sorted_tags, nbins, flush=True)
+    return {k: d[profile_indices] for k, d in profiles.items()}
+
+
+def iter_profilematrix(
+    profiles: dict[str, np.ndarray],
+    sorted_tags: npt.NDArray[np.int64],
+    *,
+    chunk_size: int = 1 << 16,
+    profile_halo_tag_field: str = "fof_halo_bin_tag",
+    profile_bin_idx_field: str = "sod_halo_bin",
+    engine: ProfileMatrixEngine = "searchsorted",
+) -> Iterator[tuple[str, slice, np.ndarray]]:
+    """streaming version of `get_profilematrix`
+
+    Yields `(field, rows, data)` with the gathered profiles `data` of shape
+    `(len(rows), nbins)` for the halos `sorted_tags[rows]`, one field and
+    `chunk_size` halos at a time. The index matrix is computed per chunk as well:
+    with memory-mapped profile arrays (e.g. `np.load(..., mmap_mode="r")`), only the
+    tag and bin fields, a `(chunk_size, nbins)` index matrix (plus an argsort of the
+    tag field with the "sort" engine) and one chunk of data are held in memory. In
+    exchange, the tag and bin fields are scanned once per chunk.
+    """
+    nbins = _get_nbins(profiles, sorted_tags, profile_bin_idx_field)
+    for start in range(0, len(sorted_tags), chunk_size):
+        rows = slice(start, min(start + chunk_size, len(sorted_tags)))
+        profile_indices = _get_complete_profile_indices(
+            profiles,
+            sorted_tags[rows],
+            nbins,
+            profile_halo_tag_field=profile_halo_tag_field,
+            profile_bin_idx_field=profile_bin_idx_field,
+            engine=engine,
+        )
+        for k, d in profiles.items():
+            yield k, rows, d[profile_indices]
+
+
+def write_profilematrix(
+    group: h5py.Group,
+    profiles: dict[str, np.ndarray],
+    sorted_tags: npt.NDArray[np.int64],
+    *,
+    chunk_size: int = 1 << 16,
+    **kwargs,
+) -> None:
+    """writes the `(nhalos, nbins)` profile matrices of all fields to an HDF5 group,
+    chunk by chunk (see `iter_profilematrix`)
+    """
+    for k, rows, data in iter_profilematrix(
+        profiles, sorted_tags, chunk_size=chunk_size, **kwargs
+    ):
+        if k not in group:
+            group.create_dataset(
+                k, shape=(len(sorted_tags), data.shape[1]), dtype=data.dtype
+            )
+        group[k][rows] = data
+
+
+class RaggedProfiles(NamedTuple):
+    """CSR-style look-up of the profiles of a list of halos
+
+    The profile rows of the i-th halo are `rows[offsets[i]:offsets[i + 1]]` (indices
+    into the profile catalog, sorted by bin). Halos without a profile have an empty
+    range and a `profile_index` of -1, otherwise `profile_index[i] == offsets[i]`.
+    """
+
+    offsets: npt.NDArray[np.int64]
+    rows: npt.NDArray[np.int64]
+    profile_index: npt.NDArray[np.int64]
+
+    @property
+    def nbins(self) -> npt.NDArray[np.int64]:
+        return np.diff(self.offsets)
+
+
+def get_ragged_profiles(
+    profiles: dict[str, np.ndarray],
+    sorted_tags: npt.NDArray[np.int64],
+    *,
+    profile_halo_tag_field: str = "fof_halo_bin_tag",
+    profile_bin_idx_field: str = "sod_halo_bin",
+) -> RaggedProfiles:
+    """finds the profiles of the halos in `sorted_tags`, allowing for missing halos and
+    a variable number of bins per halo
+
+    Only the indices of the matching profile rows are stored, the memory footprint
+    scales with the number of matched rows instead of `nhalos * nbins`.
+    """
+    if not np.all(np.diff(sorted_tags) > 0):
         raise RuntimeError("Error parsing halo profile data")
 
-    return {k: d[profile_indices] for k, d in profiles.items()}
+    if len(sorted_tags) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return RaggedProfiles(np.zeros(1, dtype=np.int64), empty, empty)
+
+    profile_tags = profiles[profile_halo_tag_field]
+    halo_index = np.searchsorted(sorted_tags, profile_tags)
+    np.minimum(halo_index, len(sorted_tags) - 1, out=halo_index)
+    rows = np.flatnonzero(sorted_tags[halo_index] == profile_tags)
+    halo_index = halo_index[rows]
+    order = np.lexsort((profiles[profile_bin_idx_field][rows], halo_index))
+    rows = rows[order]
+
+    offsets = np.zeros(len(sorted_tags) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(halo_index, minlength=len(sorted_tags)), out=offsets[1:])
+    profile_index = np.where(np.diff(offsets) > 0, offsets[:-1], -1)
+    return RaggedProfiles(offsets, rows, profile_index)
+
+
+def write_ragged_profiles(
+    group: h5py.Group,
+    profiles: dict[str, np.ndarray],
+    ragged: RaggedProfiles,
+    *,
+    chunk_size: int = 1 << 22,
+) -> None:
+    """writes the ragged profiles to an HDF5 group
+
+    Creates the datasets `offsets` and `profile_index` and one dataset per profile
+    field, which is gathered and written `chunk_size` rows at a time, so that at
+    most one chunk of one field is held in memory in addition to the input.
+    """
+    group.create_dataset("offsets", data=ragged.offsets)
+    group.create_dataset("profile_index", data=ragged.profile_index)
+    nrows = len(ragged.rows)
+    for k, d in profiles.items():
+        dataset = group.create_dataset(k, shape=(nrows,), dtype=d.dtype)
+        for start in range(0, nrows, chunk_size):
+            end = min(start + chunk_size, nrows)
+            dataset[start:end] = d[ragged.rows[start:end]]
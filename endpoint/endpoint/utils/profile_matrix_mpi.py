@@ -0,0 +1,97 @@
+import numpy as np
+import numpy.typing as npt
+from mpi4py import MPI
+
+from .mpi_exchange import alltoallv
+from .profile_matrix import ProfileMatrixEngine, get_profile_indices
+
+
+def get_tag_splitters(
+    comm: MPI.Comm, tags: npt.NDArray[np.int64], nsamples: int = 1024
+) -> npt.NDArray[np.int64]:
+    """`comm.size - 1` tag boundaries that split `tags` (distributed over all ranks)
+    into ranges of roughly equal size, from a random sample of every rank's tags
+    """
+    rng = np.random.default_rng(comm.rank)
+    sample = rng.choice(tags, size=min(nsamples, len(tags)), replace=False)
+    sample = np.sort(np.concatenate(comm.allgather(sample)))
+    if len(sample) == 0:
+        return np.zeros(comm.size - 1, dtype=np.int64)
+    quantiles = np.arange(1, comm.size) * len(sample) // comm.size
+    return sample[quantiles]
+
+
+def _get_destinations(
+    tags: npt.NDArray[np.int64], splitters: npt.NDArray[np.int64], nranks: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # order by owning rank and number of rows per rank
+    destination = np.searchsorted(splitters, tags, side="right")
+    order = np.argsort(destination, kind="stable")
+    return order, np.bincount(destination, minlength=nranks).astype(np.int64)
+
+
+def get_profilematrix_mpi(
+    comm: MPI.Comm,
+    profiles: dict[str, np.ndarray],
+    sorted_tags: npt.NDArray[np.int64],
+    *,
+    profile_halo_tag_field: str = "fof_halo_bin_tag",
+    profile_bin_idx_field: str = "sod_halo_bin",
+    engine: ProfileMatrixEngine = "searchsorted",
+) -> dict[str, np.ndarray]:
+    """distributed version of `get_profilematrix`
+
+    Every rank passes its part of the profile catalog and the (sorted) halo tags it
+    requests profiles for. Each rank owns a range of the tag space: the profile rows
+    and requested tags are sent to the owning rank, matched there and the profile
+    matrices returned to the requesting rank. The result is the same as calling
+    `get_profilematrix` with the full profile catalog on every rank.
+
+    Note
+    ----
+    Collective on `comm`. Raises a RuntimeError on all ranks if the profile of a
+    requested halo could not be found or is incomplete.
+
+    """
+    profile_tags = profiles[profile_halo_tag_field]
+    profile_bins = profiles[profile_bin_idx_field]
+    local_ok = bool(np.all(np.diff(sorted_tags) > 0)) and (
+        len(profile_bins) == 0 or np.min(profile_bins) >= 0
+    )
+    nbins = comm.allreduce(np.max(profile_bins, initial=-1) + 1, op=MPI.MAX)
+    if not comm.allreduce(local_ok, op=MPI.LAND):
+        raise RuntimeError("Error parsing halo profile data")
+
+    splitters = get_tag_splitters(comm, profile_tags)
+
+    # send profiles to the rank owning their tag range
+    order, send_counts = _get_destinations(profile_tags, splitters, comm.size)
+    owned_profiles = {
+        k: alltoallv(comm, d[order], send_counts) for k, d in profiles.items()
+    }
+
+    # send requested tags to the owning rank
+    request_order, request_counts = _get_destinations(sorted_tags, splitters, comm.size)
+    requested_tags = alltoallv(comm, sorted_tags[request_order], request_counts)
+    owned_tags, inverse = np.unique(requested_tags, return_inverse=True)
+
+    profile_indices = get_profile_indices(
+        owned_profiles[profile_halo_tag_field],
+        owned_profiles[profile_bin_idx_field],
+        owned_tags,
+        nbins,
+        engine=engine,
+    )
+    if not comm.allreduce(not np.any(profile_indices == -1), op=MPI.LAND):
+        raise RuntimeError("Error parsing halo profile data")
+    profile_indices = profile_indices[inverse]
+
+    # return the matched profiles in the order of the request
+    recv_counts = np.empty_like(request_counts)
+    comm.Alltoall(request_counts, recv_counts)
+    result = {}
+    for k, d in owned_profiles.items():
+        received = alltoallv(comm, d[profile_indices], recv_counts)
+        result[k] = np.empty_like(received)
+        result[k][request_order] = received
+    return result
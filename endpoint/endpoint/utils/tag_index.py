@@ -0,0 +1,85 @@
+import shutil
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+from datasets import Catalog, Dataset
+
+from .catalog_reader import get_sidecar_path, open_catalog
+from .tag_join import TagJoin, get_tag_order, join_ranges
+
+tag_index_files = ["order", "tags", "start", "end"]
+
+
+class TagIndex(NamedTuple):
+    """precomputed sort of a catalog by halo tag
+
+    The rows of the catalog belonging to the halo `tags[k]` are
+    `order[start[k]:end[k]]`, `tags` is sorted and unique.
+    """
+
+    order: npt.NDArray[np.int64]
+    tags: npt.NDArray[np.int64]
+    start: npt.NDArray[np.int64]
+    end: npt.NDArray[np.int64]
+
+    def join(self, halo_tags: npt.NDArray[np.int64]) -> TagJoin:
+        """the members of the halos in `halo_tags`, see `tag_join.join_tags`"""
+        lower = np.zeros(len(halo_tags), dtype=np.int64)
+        upper = np.zeros(len(halo_tags), dtype=np.int64)
+        if len(self.tags):
+            k = np.searchsorted(self.tags, halo_tags)
+            np.minimum(k, len(self.tags) - 1, out=k)
+            found = self.tags[k] == halo_tags
+            lower[found] = self.start[k[found]]
+            upper[found] = self.end[k[found]]
+        return join_ranges(self.order, lower, upper)
+
+
+def get_tag_index_directory(dataset: Dataset, catalog_name: str) -> Path:
+    return get_sidecar_path(dataset, catalog_name, "tag_index")
+
+
+def read_tags(catalog: Catalog) -> np.ndarray:
+    """reads the tag field of a catalog"""
+    return open_catalog(catalog).read(catalog.tag_field)
+
+
+def build_tag_index(tags: np.ndarray, index_directory: Path) -> TagIndex:
+    """sorts the catalog by tag and stores the index as .npy files"""
+    order = get_tag_order(tags)
+    sorted_tags = tags[order]
+    is_first = np.empty(len(sorted_tags), dtype=bool)
+    is_first[:1] = True
+    np.not_equal(sorted_tags[1:], sorted_tags[:-1], out=is_first[1:])
+    start = np.flatnonzero(is_first)
+    end = np.append(start[1:], len(sorted_tags))
+    index = TagIndex(order, sorted_tags[start], start, end)
+
+    # write to a temporary directory first, readers never see a partial index
+    tmp_directory = index_directory.with_name(index_directory.name + ".tmp")
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    tmp_directory.mkdir(parents=True, mode=0o755)
+    for name, data in zip(tag_index_files, index):
+        np.save(tmp_directory / f"{name}.npy", data.astype(np.int64, copy=False))
+    shutil.rmtree(index_directory, ignore_errors=True)
+    tmp_directory.rename(index_directory)
+    return index
+
+
+def load_tag_index(dataset: Dataset, catalog_name: str) -> TagIndex:
+    """opens the precomputed index of a catalog (memory-mapped)"""
+    index_directory = get_tag_index_directory(dataset, catalog_name)
+    if not index_directory.is_dir():
+        raise FileNotFoundError(
+            f"No tag index for catalog {catalog_name} of dataset {dataset.name} "
+            f"in {index_directory}, run build-tag-index first"
+        )
+    return TagIndex(
+        *(
+            np.load(index_directory / f"{name}.npy", mmap_mode="r")
+            for name in tag_index_files
+        )
+    )
@@ -0,0 +1,107 @@
+from typing import NamedTuple, Optional
+
+import numba
+import numpy as np
+import numpy.typing as npt
+
+
+class TagJoin(NamedTuple):
+    """members (galaxies, particles, ...) of a list of halos, grouped by halo
+
+    `rows` are the rows of the member catalog belonging to the halos, the members of
+    the i-th halo are `rows[start[i]:end[i]]` (i.e. `galaxy_index_start` and
+    `galaxy_index_end` of the extracted catalog). `halo_index[k]` is the index of the
+    halo that `rows[k]` belongs to.
+    """
+
+    rows: npt.NDArray[np.int64]
+    start: npt.NDArray[np.int64]
+    end: npt.NDArray[np.int64]
+    halo_index: npt.NDArray[np.int64]
+
+
+@numba.jit(nopython=True, parallel=True)
+def _gather_members(member_order, lower, upper, start, out_rows, out_halo_index):
+    for i in numba.prange(len(lower)):
+        n = upper[i] - lower[i]
+        out_rows[start[i] : start[i] + n] = member_order[lower[i] : upper[i]]
+        out_halo_index[start[i] : start[i] + n] = i
+
+
+@numba.jit(nopython=True, parallel=True)
+def _get_halo_index(sorted_halo_tags, halo_order, member_tags, out_halo_index):
+    for j in numba.prange(len(member_tags)):
+        tag = member_tags[j]
+        idx = np.searchsorted(sorted_halo_tags, tag)
+        if idx < len(sorted_halo_tags) and sorted_halo_tags[idx] == tag:
+            out_halo_index[j] = halo_order[idx]
+        else:
+            out_halo_index[j] = -1
+
+
+def get_tag_order(tags: np.ndarray) -> npt.NDArray[np.int64]:
+    """the (stable) order that sorts `tags`, members of a halo keep their order"""
+    return np.argsort(tags, kind="stable")
+
+
+def join_tags(
+    halo_tags: npt.NDArray[np.int64],
+    member_tags: npt.NDArray[np.int64],
+    *,
+    member_order: Optional[npt.NDArray[np.int64]] = None,
+) -> TagJoin:
+    """groups the members of the catalog with `member_tags` (e.g. the `fof_halo_tag` of
+    galaxies or particles) by the halos in `halo_tags`
+
+    Parameters
+    ----------
+    halo_tags:
+        the (unique) halo tags in the order of the extracted halo catalog
+
+    member_tags:
+        the halo tag of every row of the member catalog
+
+    member_order:
+        the order that sorts `member_tags` (see `get_tag_order`), e.g. from a
+        precomputed, memory-mapped index. Computed (`O(nmembers log(nmembers))`) if
+        not given. With it, `member_tags` and `member_order` are not copied, the
+        cost is `O(nhalos log(nmembers))` reads of both (random access, i.e. page
+        faults if they are memory-mapped) plus the size of the output.
+
+    """
+    if member_order is None:
+        member_order = get_tag_order(member_tags)
+    # searchsorted casts both arrays to a common type, i.e. would copy member_tags
+    halo_tags = np.asarray(halo_tags, dtype=member_tags.dtype)
+    lower = np.searchsorted(member_tags, halo_tags, side="left", sorter=member_order)
+    upper = np.searchsorted(member_tags, halo_tags, side="right", sorter=member_order)
+    return join_ranges(member_order, lower, upper)
+
+
+def join_ranges(
+    member_order: npt.NDArray[np.int64],
+    lower: npt.NDArray[np.int64],
+    upper: npt.NDArray[np.int64],
+) -> TagJoin:
+    """builds the `TagJoin` from the range `member_order[lower[i]:upper[i]]` of the
+    members of every halo
+    """
+    end = np.cumsum(upper - lower)
+    start = end - (upper - lower)
+    nrows = end[-1] if len(end) else 0
+    rows = np.empty(nrows, dtype=np.int64)
+    halo_index = np.empty(nrows, dtype=np.int64)
+    _gather_members(member_order, lower, upper, start, rows, halo_index)
+    return TagJoin(rows, start, end, halo_index)
+
+
+def get_halo_index(
+    halo_tags: npt.NDArray[np.int64], member_tags: npt.NDArray[np.int64]
+) -> npt.NDArray[np.int64]:
+    """the index into `halo_tags` of the halo every member belongs to, -1 if the halo
+    is not in `halo_tags`
+    """
+    halo_order = np.argsort(halo_tags)
+    halo_index = np.empty(len(member_tags), dtype=np.int64)
+    _get_halo_index(halo_tags[halo_order], halo_order, member_tags, halo_index)
+    return halo_index
@@ -0,0 +1,45 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class Timer:
+    """accumulates the wall time of named sections of a task, for the timing report
+
+    Example
+    -------
+    >>> timer = Timer()
+    >>> with timer.section("write output"):
+    ...     write_output()
+    >>> timer.log_report()
+
+    """
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        """times the enclosed block, repeated sections with the same name add up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = (
+                self.seconds.get(name, 0.0) + time.perf_counter() - start
+            )
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def report(self) -> list[str]:
+        width = max((len(name) for name in self.seconds), default=0)
+        return [
+            f"  {name:<{width}}  {seconds:8.3f}s ({self.calls[name]}x)"
+            for name, seconds in self.seconds.items()
+        ]
+
+    def log_report(self, logger: logging.Logger = logging.getLogger()) -> None:
+        logger.info("Timing report:")
+        for line in self.report():
+            logger.info(line)
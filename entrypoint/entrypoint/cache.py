@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class TTLCache(Generic[T]):
+    """Thread-safe key/value cache where every entry expires after `ttl` seconds.
+
+    Entries that are older than `refresh_after * ttl` (but not yet expired) are
+    still returned, while a background thread reloads them. This way, a warm
+    cache never blocks on the Globus API.
+    """
+
+    def __init__(self, ttl: float, *, refresh_after: float = 0.75):
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self._entries: dict[Hashable, tuple[float, T]] = {}
+        self._refreshing: set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], T]) -> T:
+        entry = self._get_entry(key, loader)
+        if entry is None:
+            return self._load(key, loader)
+        return entry[1]
+
+    def get_cached(self, key: Hashable, loader: Callable[[], T]) -> Optional[T]:
+        """Like `get`, but return None instead of loading a missing or expired entry
+
+        Stale entries are still refreshed in the background with `loader`, so that
+        callers can load the misses themselves (e.g. in one batch).
+        """
+        entry = self._get_entry(key, loader)
+        return None if entry is None else entry[1]
+
+    def _get_entry(
+        self, key: Hashable, loader: Callable[[], T]
+    ) -> Optional[tuple[float, T]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or now - entry[0] >= self.ttl:
+            return None
+        if now - entry[0] >= self.refresh_after * self.ttl:
+            self._refresh_in_background(key, loader)
+        return entry
+
+    def set(self, key: Hashable, value: T) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop `key` from the cache, or all entries if no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _load(self, key: Hashable, loader: Callable[[], T]) -> T:
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], T]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def _refresh():
+            try:
+                self._load(key, loader)
+            except Exception:
+                # keep serving the old value, the next synchronous load will
+                # surface the error once the entry has expired
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_refresh, daemon=True).start()
@@ -7,7 +7,14 @@ def _entry_point_function(
     params: dict,
     run_id: str,
 ):
-    from entrypoint.resolve import resolve
+    import os
+    from pathlib import Path
+
+    from datasets import Dataset
+    from datasets.resources import default_resource_class, estimate_resources
+    from datasets.result_index import lookup_result
+
+    from entrypoint.resolve import find_dataset, resolve
 
     # Could / should check additional stuff here:
     # - validate parameters
@@ -17,7 +24,28 @@ def _entry_point_function(
     dataset_name = params.get("dataset", None)
     if dataset_name is None:
         return {"status": "FAILED", "message": "Dataset not provided"}
-    result = resolve(endpoint_name, function_name, dataset_name)
+
+    dataset, _ = find_dataset(dataset_name)
+
+    # Return the result of an identical previous request (published by the compute
+    # endpoints to a shared index), the flow then skips the compute stage
+    cache_index = os.getenv("HCP_CACHE_INDEX")
+    if cache_index is not None and isinstance(dataset, Dataset):
+        cached_result = lookup_result(Path(cache_index), function_name, params, dataset)
+        if cached_result is not None:
+            return cached_result | {"cache_hit": True}
+
+    # Select the endpoint configuration (number of nodes) for this request
+    resource_class = default_resource_class
+    if isinstance(dataset, Dataset):
+        try:
+            resource_class = estimate_resources(function_name, params, dataset)
+        except (KeyError, TypeError, ValueError) as e:
+            return {"status": "FAILED", "message": f"Invalid parameters: {e}"}
+
+    result = resolve(endpoint_name, function_name, dataset_name, resource_class)
+    if result["status"] == "SUCCEEDED":
+        result["cache_hit"] = False
 
     return result
 
@@ -0,0 +1,58 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Optional
+
+# Upper limit of concurrent requests to the Globus Compute API
+max_lookup_workers = 16
+
+
+def get_function_names(
+    compute_client,
+    function_uuids: Iterable[str],
+    *,
+    stop_at: Optional[str] = None,
+    max_workers: int = max_lookup_workers,
+) -> dict[str, str]:
+    """Fetch the function names of a whitelist concurrently
+
+    Parameters
+    ----------
+    compute_client:
+        the globus_compute_sdk.Client used for the lookups
+
+    function_uuids:
+        the function UUIDs to look up (e.g. the `functions` of a whitelist)
+
+    stop_at:
+        if given, return as soon as a function with this name has been found.
+        Lookups that have not started yet are cancelled.
+
+    max_workers:
+        maximum number of concurrent requests
+
+    Returns
+    -------
+    a dictionary mapping function UUID -> function name for all functions that were
+    looked up. If `stop_at` was found, this may not contain the full whitelist.
+
+    """
+    function_uuids = list(function_uuids)
+    names: dict[str, str] = {}
+    if not function_uuids:
+        return names
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(function_uuids)))
+    try:
+        pending = {
+            executor.submit(compute_client.get_function, uuid): uuid
+            for uuid in function_uuids
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                uuid = pending.pop(future)
+                names[uuid] = future.result()["function_name"]
+                if stop_at is not None and names[uuid] == stop_at:
+                    return names
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return names
@@ -0,0 +1,101 @@
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, ValidationError
+
+# Must match `function_registry_version` in endpoint/compute_functions/setup_script.py
+function_registry_version = 1
+# Must match `function_registry_root` in endpoint/compute_functions/setup_script.py
+default_registry_directory = Path.home() / ".globus_compute" / "function_registries"
+
+
+class FunctionRegistryEntry(BaseModel):
+    slug: str
+    uuid: str
+    systems: Optional[list[str]] = None
+    endpoint_name: str
+    registered_at: datetime
+
+
+class EndpointRegistryEntry(BaseModel):
+    name: str
+    max_blocks: Optional[int] = None
+    nodes_per_block: Optional[int] = None
+
+
+class FunctionRegistry(BaseModel):
+    version: int
+    system: str
+    created_at: datetime
+    functions: list[FunctionRegistryEntry]
+    endpoints: list[EndpointRegistryEntry] = []
+
+
+def _registry_files() -> list[Path]:
+    # Either a list of registry files / directories (separated by ":"), or the
+    # directory `setup-endpoint` writes the registries to
+    registry_paths = os.getenv("HCP_FUNCTION_REGISTRY")
+    if registry_paths is None:
+        search_paths = [default_registry_directory]
+    else:
+        search_paths = [Path(p) for p in registry_paths.split(":") if p]
+    files: list[Path] = []
+    for path in search_paths:
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.json")))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+_lock = threading.Lock()
+_loaded_mtimes: dict[Path, float] = {}
+_index: dict[tuple[str, str], str] = {}
+_endpoint_index: dict[str, EndpointRegistryEntry] = {}
+
+
+def _load_index() -> dict[tuple[str, str], str]:
+    global _loaded_mtimes, _index, _endpoint_index
+    files = _registry_files()
+    mtimes = {f: f.stat().st_mtime for f in files}
+    with _lock:
+        if mtimes == _loaded_mtimes:
+            return _index
+        index = {}
+        endpoint_index = {}
+        for registry_file in files:
+            try:
+                registry = FunctionRegistry.model_validate_json(
+                    registry_file.read_text()
+                )
+            except ValidationError:
+                continue
+            if registry.version != function_registry_version:
+                continue
+            for entry in registry.functions:
+                index[(entry.endpoint_name, entry.slug)] = entry.uuid
+            for endpoint in registry.endpoints:
+                endpoint_index[endpoint.name] = endpoint
+        _loaded_mtimes, _index, _endpoint_index = mtimes, index, endpoint_index
+        return _index
+
+
+def lookup_function(endpoint_name: str, function_name: str) -> Optional[str]:
+    """Get the UUID of a registered function from the function registry
+
+    The registry files are written by `setup-endpoint` when registering the compute
+    functions, and re-read whenever they change. Returns None if the function is not
+    in the registry.
+    """
+    return _load_index().get((endpoint_name, function_name))
+
+
+def lookup_endpoint(endpoint_name: str) -> Optional[EndpointRegistryEntry]:
+    """Get the configuration summary (e.g. `max_blocks`) of an endpoint from the
+    function registry. Returns None if the endpoint is not in the registry.
+    """
+    _load_index()
+    return _endpoint_index.get(endpoint_name)
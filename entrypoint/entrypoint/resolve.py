@@ -1,65 +1,185 @@
+import os
+from fnmatch import fnmatchcase
+from functools import partial
+
 from datasets import datasets
 
+from .cache import TTLCache
 from .client import client
+from .lookup import get_function_names
+from .registry import lookup_endpoint, lookup_function
+from .selection import EndpointCandidate, get_strategy
 
+# Resolution caches (live as long as the entry-point worker process). Registered
+# functions are immutable, so their names can be cached much longer than the
+# endpoint status.
+_endpoint_cache: TTLCache[list[dict]] = TTLCache(
+    float(os.getenv("HCP_RESOLVE_ENDPOINT_TTL", 300))
+)
+_status_cache: TTLCache[dict] = TTLCache(float(os.getenv("HCP_RESOLVE_STATUS_TTL", 30)))
+_whitelist_cache: TTLCache[dict] = TTLCache(
+    float(os.getenv("HCP_RESOLVE_WHITELIST_TTL", 300))
+)
+_function_name_cache: TTLCache[str] = TTLCache(
+    float(os.getenv("HCP_RESOLVE_FUNCTION_TTL", 3600))
+)
 
-def resolve_endpoint(endpoint_name: str) -> str:
-    endpoints = client.get_endpoints()
-    endpoints = [e for e in endpoints if e["name"] == endpoint_name]
+
+def invalidate(endpoint_uuid: str | None = None) -> None:
+    """Drop cached status and whitelist of an endpoint (or everything if None)"""
+    if endpoint_uuid is None:
+        _endpoint_cache.invalidate()
+        _function_name_cache.invalidate()
+    _status_cache.invalidate(endpoint_uuid)
+    _whitelist_cache.invalidate(endpoint_uuid)
+
+
+def _get_endpoints() -> list[dict]:
+    return _endpoint_cache.get("endpoints", lambda: list(client.get_endpoints()))
+
+
+def _get_endpoint_status(endpoint_uuid: str) -> dict:
+    return _status_cache.get(
+        endpoint_uuid, lambda: client.get_endpoint_status(endpoint_uuid)
+    )
+
+
+def _get_allowed_functions(endpoint_uuid: str) -> dict:
+    return _whitelist_cache.get(
+        endpoint_uuid, lambda: client.get_allowed_functions(endpoint_uuid)
+    )
+
+
+def select_endpoint(
+    endpoint_name: str, strategy: str | None = None
+) -> EndpointCandidate:
+    """Select one of the online endpoints matching `endpoint_name`
+
+    `endpoint_name` may contain shell-style wildcards (e.g.
+    `compute-portal-polaris-*`), in which case the load is distributed among all
+    matching endpoints according to the selection `strategy` (see
+    `entrypoint.selection.strategies`).
+    """
+    endpoints = _get_endpoints()
+    endpoints = [e for e in endpoints if fnmatchcase(e["name"], endpoint_name)]
     if len(endpoints) == 0:
+        _endpoint_cache.invalidate()
         raise RuntimeError(f"Endpoint {endpoint_name} not found")
-    endpoint = None
+    candidates = []
     for e in endpoints:
-        status = client.get_endpoint_status(e["uuid"])
+        status = _get_endpoint_status(e["uuid"])
         if status["status"] == "online":
-            endpoint = e
-            break
-    if endpoint is None:
+            try:
+                registry_entry = lookup_endpoint(e["name"])
+            except (OSError, ValueError):
+                # unreadable registry, select without the registry information
+                registry_entry = None
+            candidates.append(
+                EndpointCandidate(
+                    name=e["name"],
+                    uuid=e["uuid"],
+                    status=status,
+                    max_blocks=registry_entry.max_blocks if registry_entry else None,
+                )
+            )
+    if len(candidates) == 0:
+        for e in endpoints:
+            _status_cache.invalidate(e["uuid"])
         raise RuntimeError(f"Endpoint {endpoint_name} is not online")
 
-    return endpoint["uuid"]
+    return get_strategy(strategy).select(candidates)
 
 
-def resolve_function(function_name: str, endpoint_uuid: str, endpoint_name: str) -> str:
-    whitelist = client.get_allowed_functions(endpoint_uuid)
+def resolve_endpoint(endpoint_name: str) -> str:
+    return select_endpoint(endpoint_name).uuid
+
+
+def _get_function_name(function_uuid: str) -> str:
+    return client.get_function(function_uuid)["function_name"]
+
+
+def _find_function(function_name: str, endpoint_uuid: str) -> str | None:
+    whitelist = _get_allowed_functions(endpoint_uuid)
     if not whitelist["restricted"]:
-        raise RuntimeError(f"Whitelist for endpoint {endpoint_name} not found")
-    function_uuids = whitelist["functions"]
-    for uuid in function_uuids:
-        function = client.get_function(uuid)
-        if function["function_name"] == function_name:
+        return None
+    uncached = []
+    for uuid in whitelist["functions"]:
+        # stale names are refreshed in the background, only the misses are fetched
+        # (concurrently) below
+        name = _function_name_cache.get_cached(uuid, partial(_get_function_name, uuid))
+        if name is None:
+            uncached.append(uuid)
+        elif name == function_name:
             return uuid
-    raise RuntimeError(
-        f"Function {function_name} not found in whitelist of endpoint {endpoint_name}"
-    )
+    names = get_function_names(client, uncached, stop_at=function_name)
+    for uuid, name in names.items():
+        _function_name_cache.set(uuid, name)
+    return next((uuid for uuid, name in names.items() if name == function_name), None)
 
 
-def resolve(endpoint_format_string: str, function_name: str, dataset_name: str):
-    system = None
+def resolve_function(function_name: str, endpoint_uuid: str, endpoint_name: str) -> str:
+    try:
+        uuid = lookup_function(endpoint_name, function_name)
+    except (OSError, ValueError):
+        # unreadable registry, use the Globus API instead
+        uuid = None
+    if uuid is not None:
+        # the registry may be stale (e.g. functions registered again since)
+        whitelist = _get_allowed_functions(endpoint_uuid)
+        if not whitelist["restricted"] or uuid in whitelist["functions"]:
+            return uuid
+    uuid = _find_function(function_name, endpoint_uuid)
+    if uuid is None:
+        # the whitelist may have changed since it was cached, try once more
+        _whitelist_cache.invalidate(endpoint_uuid)
+        whitelist = _get_allowed_functions(endpoint_uuid)
+        if not whitelist["restricted"]:
+            raise RuntimeError(f"Whitelist for endpoint {endpoint_name} not found")
+        uuid = _find_function(function_name, endpoint_uuid)
+    if uuid is None:
+        raise RuntimeError(
+            f"Function {function_name} not found in whitelist of endpoint {endpoint_name}"
+        )
+    return uuid
+
+
+def find_dataset(dataset_name: str):
+    """Returns the dataset (or group of datasets) and the system it is located on"""
     for key, ds in datasets.items():
         if isinstance(ds, dict):
             if key == dataset_name:
-                dataset = ds
-                system = next(iter(ds.values())).system
-                break
+                return ds, next(iter(ds.values())).system
         else:
             if ds.name == dataset_name:
-                dataset = ds
-                system = dataset.system
+                return ds, ds.system
+    return None, None
+
 
-                break
+def resolve(
+    endpoint_format_string: str,
+    function_name: str,
+    dataset_name: str,
+    resource_class: str = "1-node",
+):
+    _, system = find_dataset(dataset_name)
     if system is None:
         return {
             "status": "FAILED",
             "message": f"Dataset {dataset_name} not found",
         }
 
-    endpoint_name = endpoint_format_string.format(SYSTEM=system)
+    endpoint_name = endpoint_format_string.format(
+        SYSTEM=system, RESOURCES=resource_class
+    )
 
+    endpoint_uuid = None
     try:
-        endpoint_uuid = resolve_endpoint(endpoint_name)
-        function_uuid = resolve_function(function_name, endpoint_uuid, endpoint_name)
+        endpoint = select_endpoint(endpoint_name)
+        endpoint_uuid = endpoint.uuid
+        function_uuid = resolve_function(function_name, endpoint_uuid, endpoint.name)
     except RuntimeError as e:
+        if endpoint_uuid is not None:
+            invalidate(endpoint_uuid)
         return {"status": "FAILED", "message": e.args[0]}
     return {
         "status": "SUCCEEDED",
@@ -0,0 +1,100 @@
+import itertools
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+from pydantic import BaseModel
+
+
+class EndpointCandidate(BaseModel):
+    name: str
+    uuid: str
+    status: dict
+    max_blocks: Optional[int] = None
+
+
+class SelectionStrategy(Protocol):
+    def select(self, candidates: list[EndpointCandidate]) -> EndpointCandidate: ...
+
+
+class RoundRobin:
+    """Cycle through the online endpoints matching a name
+
+    There is one counter per set of candidates, only the `max_counters` most
+    recently used ones are kept.
+    """
+
+    def __init__(self, max_counters: int = 128):
+        self.max_counters = max_counters
+        self._counters: OrderedDict[tuple[str, ...], itertools.count] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def select(self, candidates: list[EndpointCandidate]) -> EndpointCandidate:
+        candidates = sorted(candidates, key=lambda c: c.uuid)
+        key = tuple(c.uuid for c in candidates)
+        with self._lock:
+            counter = self._counters.setdefault(key, itertools.count())
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_counters:
+                self._counters.popitem(last=False)
+            i = next(counter)
+        return candidates[i % len(candidates)]
+
+
+class LeastOutstandingTasks:
+    """Pick the endpoint with the fewest outstanding tasks
+
+    The outstanding tasks are taken from the endpoint status details. Since the
+    status is cached, tasks dispatched by this process within the last `window`
+    seconds are added on top, so that bursts do not all land on the same endpoint.
+    """
+
+    def __init__(self, window: float = 30.0):
+        self.window = window
+        self._dispatched: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, candidate: EndpointCandidate, now: float) -> int:
+        details = candidate.status.get("details") or {}
+        outstanding = details.get("outstanding_tasks") or 0
+        if isinstance(outstanding, dict):
+            # some endpoint versions report outstanding tasks per executor
+            outstanding = sum(outstanding.values())
+        recent = [t for t in self._dispatched.get(candidate.uuid, []) if t > now]
+        self._dispatched[candidate.uuid] = recent
+        return int(outstanding) + len(recent)
+
+    def select(self, candidates: list[EndpointCandidate]) -> EndpointCandidate:
+        now = time.monotonic()
+        with self._lock:
+            candidate = min(candidates, key=lambda c: self._load(c, now))
+            self._dispatched.setdefault(candidate.uuid, []).append(now + self.window)
+        return candidate
+
+
+class WeightedByMaxBlocks:
+    """Randomly pick an endpoint, weighted by its configured `max_blocks`"""
+
+    def select(self, candidates: list[EndpointCandidate]) -> EndpointCandidate:
+        weights = [c.max_blocks or 1 for c in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+
+strategies: dict[str, SelectionStrategy] = {
+    "round-robin": RoundRobin(),
+    "least-outstanding": LeastOutstandingTasks(
+        window=float(os.getenv("HCP_RESOLVE_STATUS_TTL", 30))
+    ),
+    "weighted": WeightedByMaxBlocks(),
+}
+default_strategy = os.getenv("HCP_ENDPOINT_SELECTION", "least-outstanding")
+
+
+def get_strategy(name: Optional[str] = None) -> SelectionStrategy:
+    name = name or default_strategy
+    if name not in strategies:
+        raise RuntimeError(f"Unknown endpoint selection strategy {name}")
+    return strategies[name]
@@ -42,20 +42,41 @@ def compute_with_check_flow_builder(
                 },
                 "SetupCheck": {
                     "Type": "Choice",
+                    # FAILED results do not contain "cache_hit", check them first
                     "Choices": [
                         {
                             "Variable": "$.SetupResults.details.result[0].status",
-                            "StringEquals": "SUCCEEDED",
-                            "Next": "SetupSucceed",
+                            "StringEquals": "FAILED",
+                            "Next": "SetupFail",
+                        },
+                        {
+                            "And": [
+                                {
+                                    "Variable": "$.SetupResults.details.result[0].status",
+                                    "StringEquals": "SUCCEEDED",
+                                },
+                                {
+                                    "Variable": "$.SetupResults.details.result[0].cache_hit",
+                                    "BooleanEquals": True,
+                                },
+                            ],
+                            "Next": "CachedResult",
                         },
                         {
                             "Variable": "$.SetupResults.details.result[0].status",
-                            "StringEquals": "FAILED",
-                            "Next": "SetupFail",
+                            "StringEquals": "SUCCEEDED",
+                            "Next": "SetupSucceed",
                         },
                     ],
                     "Default": "SetupFail",
                 },
+                "CachedResult": {
+                    "Comment": "The setup function returned a cached result, skip the compute stage",
+                    "Type": "Pass",
+                    "InputPath": "$.SetupResults",
+                    "ResultPath": "$.ComputeResults",
+                    "Next": "ComputeCheck",
+                },
                 "SetupFail": {
                     "Type": "Fail",
                     "Cause": "Setup function failed",
@@ -183,9 +204,18 @@ def compute_with_check_flow_builder(
             FlowStage(
                 tag="assigning",
                 name="Assigning Resources",
-                globusStates=["Setup", "SetupCheck", "SetupFail", "SetupSucceed"],
+                globusStates=[
+                    "Setup",
+                    "SetupCheck",
+                    "SetupFail",
+                    "SetupSucceed",
+                    "CachedResult",
+                ],
                 startedCode={"code": "ActionStarted", "state": "Setup"},
-                successCodes=[{"code": "PassCompleted", "state": "SetupSucceed"}],
+                successCodes=[
+                    {"code": "PassCompleted", "state": "SetupSucceed"},
+                    {"code": "PassCompleted", "state": "CachedResult"},
+                ],
                 failCodes=[
                     {"code": "FlowFailed", "state": "SetupFail"},
                     {"code": "FlowFailed", "state": "Setup"},
@@ -197,7 +227,12 @@ def compute_with_check_flow_builder(
                 name="Computing",
                 globusStates=["Compute"],
                 startedCode={"code": "ActionStarted", "state": "Compute"},
-                successCodes=[{"code": "ActionCompleted", "state": "Compute"}],
+                # on a cache hit, Compute is skipped (CachedResult -> ComputeCheck) and
+                # the stage completes without having started
+                successCodes=[
+                    {"code": "ActionCompleted", "state": "Compute"},
+                    {"code": "PassCompleted", "state": "CachedResult"},
+                ],
                 failCodes=[
                     {"code": "ActionFailed", "state": "Compute"},
                     {"code": "FlowFailed", "state": "Compute"},
@@ -206,8 +241,8 @@ def compute_with_check_flow_builder(
             FlowStage(
                 tag="finalizing",
                 name="Checking Results",
-                globusStates=["CheckSuccessOrFail", "ComputeSucceed", "ComputeFail"],
-                startedCode={"code": "ChoiceStarted", "state": "CheckSuccessOrFail"},
+                globusStates=["ComputeCheck", "ComputeSucceed", "ComputeFail"],
+                startedCode={"code": "ChoiceStarted", "state": "ComputeCheck"},
                 successCodes=[{"code": "PassCompleted", "state": "ComputeSucceed"}],
                 failCodes=[{"code": "FlowFailed", "state": "ComputeFail"}],
             ),
@@ -1,7 +1,8 @@
 import click
 import globus_compute_sdk
-from compute_functions import compute_functions
+from compute_functions import compute_functions, resource_classes
 
+from entrypoint.lookup import get_function_names
 from flows.backend_flow_adapters import get_flow_adapters
 from flows.utils import bcolors
 
@@ -23,8 +24,11 @@ def cli():
     for adapter_name, adapter in adapters.items():
         target_endpoints.update(
             {
-                adapter["flow_input"]["compute_endpoint_name"].format(SYSTEM=s)
+                adapter["flow_input"]["compute_endpoint_name"].format(
+                    SYSTEM=s, RESOURCES=r
+                )
                 for s in systems
+                for r in resource_classes
             }
         )
 
@@ -75,10 +79,9 @@ def cli():
                 f"{bcolors.ENDC}"
             )
             continue
-        whitelist_functions = set()
-        for uuid in whitelist:
-            fct = compute_client.get_function(uuid)
-            whitelist_functions.add(fct["function_name"])
+        whitelist_functions = set(
+            get_function_names(compute_client, whitelist).values()
+        )
         for slug in function_names - whitelist_functions:
             print(
                 f"{bcolors.WARNING}WARNING: Function not in whitelist: {slug} "